@@ -1,3 +1,9 @@
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
@@ -10,6 +16,17 @@ settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# bcrypt releases the GIL, so hashing on these threads leaves the event loop free
+_bcrypt_executor = ThreadPoolExecutor(max_workers=settings.bcrypt_workers, thread_name_prefix="bcrypt")
+_bcrypt_slots = asyncio.Semaphore(settings.bcrypt_workers)
+_bcrypt_waiting = 0
+_bcrypt_running = 0
+
+# sha256(token) -> (payload, expires_at); LRU order, oldest first.
+# verify_token runs on FastAPI's threadpool, so every access holds the lock
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -19,6 +36,57 @@ def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
 
+def _too_busy() -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="Too many login attempts, try again shortly",
+        headers={"Retry-After": "1"},
+    )
+
+
+async def _run_bcrypt(fn, *args):
+    """Run a bcrypt call on its pool, queueing behind busy workers or shedding with 503."""
+    global _bcrypt_waiting, _bcrypt_running
+    if _bcrypt_waiting >= settings.bcrypt_max_queue:
+        raise _too_busy()
+    _bcrypt_waiting += 1
+    try:
+        await asyncio.wait_for(_bcrypt_slots.acquire(), settings.bcrypt_queue_timeout)
+    except asyncio.TimeoutError:
+        raise _too_busy()
+    finally:
+        _bcrypt_waiting -= 1
+    _bcrypt_running += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_bcrypt_executor, fn, *args)
+    finally:
+        _bcrypt_running -= 1
+        _bcrypt_slots.release()
+
+
+def bcrypt_stats() -> dict:
+    return {
+        "workers": settings.bcrypt_workers,
+        "running": _bcrypt_running,
+        "waiting": _bcrypt_waiting,
+        "max_queue": settings.bcrypt_max_queue,
+    }
+
+
+async def check_password(plain_password: str, hashed_password: str) -> bool:
+    """verify_password on the bcrypt pool."""
+    return await _run_bcrypt(verify_password, plain_password, hashed_password)
+
+
+async def hash_password(password: str) -> str:
+    """get_password_hash on the bcrypt pool."""
+    return await _run_bcrypt(get_password_hash, password)
+
+
+def shutdown():
+    _bcrypt_executor.shutdown(wait=False, cancel_futures=True)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -> str:
     to_encode = data.copy()
     if expires_delta:
@@ -30,8 +98,38 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None) -
     return encoded_jwt
 
 
+def _cached_payload(key: str) -> Optional[dict]:
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        if entry is None:
+            return None
+        payload, expires_at = entry
+        if time.time() >= expires_at:
+            del _token_cache[key]
+            return None
+        _token_cache.move_to_end(key)
+        return payload
+
+
+def _remember(key: str, payload: dict):
+    if settings.token_cache_size <= 0:
+        return
+    # Never outlive the token itself
+    expires_at = min(time.time() + settings.token_cache_ttl, payload.get("exp", 0))
+    with _token_cache_lock:
+        _token_cache[key] = (payload, expires_at)
+        _token_cache.move_to_end(key)
+        while len(_token_cache) > settings.token_cache_size:
+            _token_cache.popitem(last=False)
+
+
 def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security)) -> dict:
+    """Return the token's claims (username, role, division), checking the signature once per TTL."""
     token = credentials.credentials
+    key = hashlib.sha256(token.encode()).hexdigest()
+    payload = _cached_payload(key)
+    if payload is not None:
+        return payload
     try:
         payload = jwt.decode(token, settings.jwt_secret, algorithms=[settings.jwt_algorithm])
         username: str = payload.get("username")
@@ -40,9 +138,20 @@ def verify_token(credentials: HTTPAuthorizationCredentials = Depends(security))
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid token",
             )
+        _remember(key, payload)
         return payload
     except JWTError:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Token expired or invalid",
         )
+
+
+def require_admin(user: dict = Depends(verify_token)) -> dict:
+    """verify_token, restricted to admin accounts."""
+    if user.get("role") != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin only",
+        )
+    return user
@@ -0,0 +1,89 @@
+"""
+Load test: does a burst of logins slow down map reads?
+Measures load_layer latency on its own, then again while a burst of
+concurrent logins is in flight, and reports both side by side.
+Usage:
+    python bench_login.py --formid fid_1700000000000
+    python bench_login.py --formid fid_1700000000000 --logins 200 --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import time
+import httpx
+from benchmark.stats import percentile
+
+
+def summary(samples: list) -> str:
+    ms = [s * 1000 for s in samples]
+    return (f"n={len(ms):<5} p50={percentile(ms, 50):8.1f} ms  "
+            f"p95={percentile(ms, 95):8.1f} ms  max={max(ms):8.1f} ms")
+
+
+async def probe_load_layer(client: httpx.AsyncClient, formid: str, limit: int, stop: asyncio.Event) -> list:
+    """Issue load_layer requests back to back until stopped; return their latencies."""
+    latencies = []
+    while not stop.is_set():
+        started = time.perf_counter()
+        response = await client.post("/api/load_layer", json={"formid": formid, "limit": limit})
+        response.raise_for_status()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+async def login(client: httpx.AsyncClient, username: str, password: str) -> tuple:
+    started = time.perf_counter()
+    response = await client.post("/api/login", json={"username": username, "password": password})
+    return response.status_code, time.perf_counter() - started
+
+
+async def measure(client, args, burst: bool):
+    stop = asyncio.Event()
+    probes = [asyncio.create_task(probe_load_layer(client, args.formid, args.limit, stop))
+              for _ in range(args.readers)]
+    logins = []
+    if burst:
+        logins = await asyncio.gather(*(login(client, args.username, args.password) for _ in range(args.logins)))
+    else:
+        await asyncio.sleep(args.baseline)
+    stop.set()
+    latencies = [s for probe in await asyncio.gather(*probes) for s in probe]
+    return latencies, logins
+
+
+async def run(args):
+    limits = httpx.Limits(max_connections=args.logins + args.readers)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=120) as client:
+        status, _ = await login(client, args.username, args.password)
+        if status != 200:
+            raise SystemExit(f"❌ Login as {args.username} failed with {status}; create the user first")
+
+        print(f"📊 load_layer({args.formid}, limit={args.limit}) with {args.readers} readers")
+        baseline, _ = await measure(client, args, burst=False)
+        print(f"  idle            {summary(baseline)}")
+
+        loaded, logins = await measure(client, args, burst=True)
+        print(f"  {args.logins:>4} logins     {summary(loaded)}")
+
+        codes = {}
+        for code, _ in logins:
+            codes[code] = codes.get(code, 0) + 1
+        print(f"🔐 logins: {summary([t for _, t in logins])}  status counts {codes}")
+        print(f"   load_layer p95 under burst is {percentile(loaded, 95) / percentile(baseline, 95):.1f}x idle")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--formid", required=True)
+    parser.add_argument("--limit", type=int, default=100, help="load_layer page size")
+    parser.add_argument("--username", default="test")
+    parser.add_argument("--password", default="test1234")
+    parser.add_argument("--logins", type=int, default=100, help="concurrent logins in the burst")
+    parser.add_argument("--readers", type=int, default=4, help="concurrent load_layer clients")
+    parser.add_argument("--baseline", type=float, default=5.0, help="seconds of idle measurement")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
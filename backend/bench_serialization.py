@@ -0,0 +1,108 @@
+"""
+Micro-benchmark: FastAPI jsonable_encoder path vs. the orjson RecordsResponse path
+Usage:
+    python bench_serialization.py              # synthetic rows, no database needed
+    python bench_serialization.py --db         # real asyncpg Records from generate_series
+    python bench_serialization.py --sizes 10000 100000
+"""
+
+import argparse
+import asyncio
+import datetime
+import decimal
+import json
+import time
+import asyncpg
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from config import get_settings
+from responses import RecordsResponse
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+# Shaped like a load_layer row: base columns, a few attributes and geojson
+DB_SQL = """
+    SELECT g AS id, 'ref' || g AS refid,
+           timestamp '2024-01-01' + g * interval '1 minute' AS ts, NULL::text AS style,
+           'โรงเรียนเทศบาล ' || g AS name, (g % 500)::numeric + 0.25 AS students,
+           date '2024-01-01' + (g % 365) AS visited,
+           '{"type":"Point","coordinates":[98.98' || g % 10 || ',18.78' || g % 7 || ']}' AS geojson
+    FROM generate_series(1, $1) AS g
+"""
+
+
+def synthetic_rows(n: int) -> list:
+    base_ts = datetime.datetime(2024, 1, 1)
+    base_date = datetime.date(2024, 1, 1)
+    return [
+        {
+            "id": g,
+            "refid": f"ref{g}",
+            "ts": base_ts + datetime.timedelta(minutes=g),
+            "style": None,
+            "name": f"โรงเรียนเทศบาล {g}",
+            "students": decimal.Decimal(g % 500) + decimal.Decimal("0.25"),
+            "visited": base_date + datetime.timedelta(days=g % 365),
+            "geojson": f'{{"type":"Point","coordinates":[98.98{g % 10},18.78{g % 7}]}}',
+        }
+        for g in range(1, n + 1)
+    ]
+
+
+def encoder_path(rows) -> bytes:
+    # What the routes did before: Record -> dict -> jsonable_encoder -> json
+    return JSONResponse(jsonable_encoder([dict(row) for row in rows])).body
+
+
+def orjson_path(rows) -> bytes:
+    return RecordsResponse(rows).body
+
+
+def timed(fn, rows, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn(rows)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+async def load_rows(sizes: list, use_db: bool) -> dict:
+    if not use_db:
+        return {n: synthetic_rows(n) for n in sizes}
+
+    settings = get_settings()
+    conn = await asyncpg.connect(
+        host=settings.pg_host,
+        port=settings.pg_port,
+        user=settings.pg_user,
+        password=settings.pg_password,
+        database=settings.pg_name
+    )
+    try:
+        return {n: await conn.fetch(DB_SQL, n) for n in sizes}
+    finally:
+        await conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--db", action="store_true", help="fetch real asyncpg Records")
+    args = parser.parse_args()
+
+    datasets = asyncio.run(load_rows(args.sizes, args.db))
+    print(f"📊 Serialization benchmark ({'asyncpg Records' if args.db else 'synthetic dicts'}, best of {args.repeat})")
+    print(f"{'rows':>10} {'encoder (s)':>12} {'orjson (s)':>12} {'speedup':>8} {'bytes':>12}")
+    for n, rows in datasets.items():
+        # Both paths must produce the same document
+        assert json.loads(encoder_path(rows[:100])) == json.loads(orjson_path(rows[:100]))
+        slow = timed(encoder_path, rows, args.repeat)
+        fast = timed(orjson_path, rows, args.repeat)
+        size = len(orjson_path(rows))
+        print(f"{n:>10} {slow:>12.3f} {fast:>12.3f} {slow / fast:>7.1f}x {size:>12}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,4 @@
+"""
+Reproducible benchmark suite: synthetic layer generation plus a concurrent
+HTTP driver for the layer routes. See ``python -m benchmark --help``.
+"""
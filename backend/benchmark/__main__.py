@@ -0,0 +1,128 @@
+"""
+Benchmark suite for the LGIA API
+Generates synthetic point/linestring/polygon layers with COPY, drives the
+layer routes with concurrent clients against a running server and writes
+throughput and p50/p95/p99 latency as JSON.
+Usage (from backend/, with the API and PostGIS running):
+    python -m benchmark run --rows 10000 100000 --output bench-1.0.json
+    python -m benchmark run --geometry point --rows 1000000 --routes load_layer search
+    python -m benchmark generate --geometry polygon --rows 10000000 --columns text:4,numeric:2
+    python -m benchmark compare bench-1.0.json bench-1.1.json
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import httpx
+from benchmark.generate import GEOMETRIES, generate, parse_columns
+from benchmark.run import ROUTES, metadata, run_layer
+
+
+def add_layer_args(parser):
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--geometry", nargs="+", choices=GEOMETRIES, default=list(GEOMETRIES))
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000])
+    parser.add_argument("--columns", default="text:2,numeric:2,date:1", help="column mix, e.g. text:3,numeric:1")
+    parser.add_argument("--seed", type=int, default=42)
+
+
+async def generate_layers(client: httpx.AsyncClient, args) -> list:
+    col_types = parse_columns(args.columns)
+    layers = []
+    for geometry in args.geometry:
+        for rows in args.rows:
+            print(f"🗺️  Generating {rows} {geometry} features...", file=sys.stderr)
+            layer = await generate(client, geometry, rows, col_types, args.seed)
+            print(f"  ✅ {layer['formid']}: {layer['rows_per_sec']} rows/s", file=sys.stderr)
+            layers.append(layer)
+    return layers
+
+
+async def cmd_generate(args):
+    async with httpx.AsyncClient(base_url=args.url, timeout=None) as client:
+        layers = await generate_layers(client, args)
+    print(json.dumps(layers, ensure_ascii=False, indent=2))
+
+
+async def cmd_run(args):
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+        report = {"meta": metadata(args), "layers": await generate_layers(client, args), "results": []}
+        try:
+            for layer in report["layers"]:
+                print(f"📊 Benchmarking {layer['geometry']} x {layer['rows']}...", file=sys.stderr)
+                report["results"] += await run_layer(client, layer, args)
+        finally:
+            if not args.keep:
+                for layer in report["layers"]:
+                    await client.post("/api/delete_layer", json={"formid": layer["formid"]})
+
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+        print(f"✅ Report written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+
+def cmd_compare(args):
+    def load(path):
+        with open(path, encoding="utf-8") as f:
+            report = json.load(f)
+        return report["meta"], {(r["route"], r["geometry"], r["rows"]): r for r in report["results"]}
+
+    base_meta, base = load(args.baseline)
+    new_meta, new = load(args.candidate)
+    print(f"baseline  {base_meta.get('git_commit')} {base_meta['started_at']}")
+    print(f"candidate {new_meta.get('git_commit')} {new_meta['started_at']}")
+    print(f"{'route':<24}{'geometry':<12}{'rows':>10}{'p50 ms':>20}{'p95 ms':>20}{'p99 ms':>20}{'rps':>20}")
+
+    def cell(old, cur):
+        change = f"{(cur - old) / old * 100:+.0f}%" if old else "n/a"
+        return f"{cur:>11.1f} {change:>7}"
+
+    for key in sorted(base.keys() & new.keys()):
+        b, n = base[key], new[key]
+        if not b["latency_ms"] or not n["latency_ms"]:
+            continue
+        row = "".join(cell(b["latency_ms"][p], n["latency_ms"][p]) + " " for p in ("p50", "p95", "p99"))
+        print(f"{key[0]:<24}{key[1]:<12}{key[2]:>10} {row}{cell(b['throughput_rps'], n['throughput_rps'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    gen = commands.add_parser("generate", help="create synthetic layers and keep them")
+    add_layer_args(gen)
+
+    run = commands.add_parser("run", help="generate layers, benchmark the routes, report JSON")
+    add_layer_args(run)
+    run.add_argument("--routes", nargs="+", choices=ROUTES, default=list(ROUTES))
+    run.add_argument("--requests", type=int, default=500, help="requests per route and layer")
+    run.add_argument("--concurrency", type=int, default=16)
+    run.add_argument("--warmup", type=int, default=20)
+    run.add_argument("--timeout", type=float, default=120)
+    run.add_argument("--upload-requests", type=int, default=5)
+    run.add_argument("--upload-concurrency", type=int, default=1)
+    run.add_argument("--upload-rows", type=int, default=10_000)
+    run.add_argument("--output", help="write the JSON report here instead of stdout")
+    run.add_argument("--keep", action="store_true", help="keep the generated layers")
+
+    cmp = commands.add_parser("compare", help="compare two JSON reports")
+    cmp.add_argument("baseline")
+    cmp.add_argument("candidate")
+
+    args = parser.parse_args()
+    if args.command == "generate":
+        asyncio.run(cmd_generate(args))
+    elif args.command == "run":
+        asyncio.run(cmd_run(args))
+    else:
+        cmd_compare(args)
+
+
+if __name__ == "__main__":
+    main()
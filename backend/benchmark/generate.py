@@ -0,0 +1,152 @@
+"""
+Synthetic layer generator: creates a layer through the API so it gets the
+same table, indexes, rollup and search triggers as a real one, then bulk
+loads it with COPY through a staging table.
+"""
+
+import datetime
+import time
+import asyncpg
+import httpx
+import numpy as np
+from config import get_settings
+import catalog
+
+GEOMETRIES = ("point", "linestring", "polygon")
+COLUMN_TYPES = ("text", "numeric", "date")
+CHUNK_ROWS = 200_000
+
+# Roughly the extent of Thailand
+LNG_RANGE = (97.5, 105.5)
+LAT_RANGE = (5.6, 20.4)
+TS_START = datetime.datetime(2022, 1, 1)
+TS_SPAN_DAYS = 3 * 365
+DATE_START = datetime.date(2020, 1, 1)
+
+# Words for text columns, so search and facet benchmarks hit real values
+WORDS = ["วัด", "โรงเรียน", "ตลาด", "โรงพยาบาล", "สวนสาธารณะ", "บ่อน้ำ", "ฝาย", "ศาลา", "สะพาน", "ชุมชน"]
+
+GEOM_SQL = {
+    "point": "ST_SetSRID(ST_MakePoint(x, y), 4326)",
+    "linestring": """ST_SetSRID(ST_MakeLine(ARRAY[ST_MakePoint(x, y),
+                                                  ST_MakePoint(x + 0.01, y + 0.005),
+                                                  ST_MakePoint(x + 0.02, y)]), 4326)""",
+    "polygon": "ST_MakeEnvelope(x, y, x + 0.01, y + 0.01, 4326)",
+}
+
+
+def parse_columns(spec: str) -> list:
+    """'text:3,numeric:2,date:1' -> ['text', 'text', 'text', 'numeric', 'numeric', 'date']"""
+    types = []
+    for part in filter(None, spec.split(",")):
+        col_type, _, count = part.partition(":")
+        if col_type not in COLUMN_TYPES:
+            raise ValueError(f"Unknown column type {col_type!r}, expected one of {', '.join(COLUMN_TYPES)}")
+        types += [col_type] * int(count or 1)
+    return types
+
+
+def text_values(rng, n: int) -> list:
+    words = rng.integers(0, len(WORDS), n)
+    numbers = rng.integers(1, 1000, n)
+    return [f"{WORDS[w]} {k}" for w, k in zip(words.tolist(), numbers.tolist())]
+
+
+def _chunk_records(rng, n: int, start: int, col_types: list):
+    x = rng.uniform(*LNG_RANGE, n).tolist()
+    y = rng.uniform(*LAT_RANGE, n).tolist()
+    minutes = rng.integers(0, TS_SPAN_DAYS * 24 * 60, n).tolist()
+    ts = [TS_START + datetime.timedelta(minutes=m) for m in minutes]
+    columns = []
+    for col_type in col_types:
+        if col_type == "text":
+            columns.append(text_values(rng, n))
+        elif col_type == "numeric":
+            columns.append(np.round(rng.uniform(0, 1000, n), 2).tolist())
+        else:
+            columns.append([DATE_START + datetime.timedelta(days=d) for d in rng.integers(0, 5 * 365, n).tolist()])
+    refids = [f"bench{start + i}" for i in range(n)]
+    return list(zip(refids, ts, x, y, *columns))
+
+
+async def connect():
+    settings = get_settings()
+    return await asyncpg.connect(
+        host=settings.pg_host,
+        port=settings.pg_port,
+        user=settings.pg_user,
+        password=settings.pg_password,
+        database=settings.pg_name,
+        server_settings={"statement_timeout": "0"},
+    )
+
+
+async def create_layer(client: httpx.AsyncClient, geometry: str, rows: int, col_types: list) -> dict:
+    """Create an empty layer through /api/create_table and return its formid and columns."""
+    response = await client.post("/api/create_table", json={
+        "division": "benchmark",
+        "layername": f"bench {geometry} {rows}",
+        "layertype": geometry,
+        "columes": [
+            {"column_name": f"{col_type}_{i}", "column_type": col_type, "column_desc": "benchmark"}
+            for i, col_type in enumerate(col_types)
+        ],
+    })
+    response.raise_for_status()
+    formid = response.json()["formid"]
+    response = await client.post("/api/load_column", json={"formid": formid})
+    response.raise_for_status()
+    columns = [{"col_id": c["col_id"], "col_type": c["col_type"]} for c in response.json()]
+    return {"formid": formid, "columns": columns}
+
+
+async def load_layer_rows(conn, formid: str, geometry: str, columns: list, rows: int, seed: int) -> float:
+    """COPY `rows` synthetic features into the layer; returns the elapsed seconds."""
+    rng = np.random.default_rng(seed)
+    col_ids = [c["col_id"] for c in columns]
+    col_types = [c["col_type"] for c in columns]
+    col_defs = "".join(f", {c} {t}" for c, t in zip(col_ids, col_types))
+    col_list = "".join(f", {c}" for c in col_ids)
+
+    started = time.perf_counter()
+    await conn.execute(
+        f"CREATE TEMP TABLE bench_staging (refid text, ts timestamp, x float8, y float8{col_defs})"
+    )
+    try:
+        for start in range(0, rows, CHUNK_ROWS):
+            n = min(CHUNK_ROWS, rows - start)
+            await conn.copy_records_to_table(
+                "bench_staging",
+                records=_chunk_records(rng, n, start, col_types),
+                columns=["refid", "ts", "x", "y"] + col_ids,
+            )
+            # One set-based insert per chunk, so the statement triggers fire once
+            await conn.execute(
+                f"""INSERT INTO {formid} (refid, ts, geom{col_list})
+                    SELECT refid, ts, {GEOM_SQL[geometry]}{col_list} FROM bench_staging"""
+            )
+            await conn.execute("TRUNCATE bench_staging")
+    finally:
+        await conn.execute("DROP TABLE IF EXISTS bench_staging")
+    await conn.execute(f"ANALYZE {formid}")
+
+    # Loaded behind the API's back, so announce a new version to the workers
+    await catalog.bump_version(conn, formid)
+    return time.perf_counter() - started
+
+
+async def generate(client: httpx.AsyncClient, geometry: str, rows: int, col_types: list, seed: int) -> dict:
+    layer = await create_layer(client, geometry, rows, col_types)
+    conn = await connect()
+    try:
+        elapsed = await load_layer_rows(conn, layer["formid"], geometry, layer["columns"], rows, seed)
+    finally:
+        await conn.close()
+    return {
+        "formid": layer["formid"],
+        "geometry": geometry,
+        "rows": rows,
+        "columns": layer["columns"],
+        "load_seconds": round(elapsed, 3),
+        "rows_per_sec": round(rows / elapsed, 1) if elapsed > 0 else rows,
+    }
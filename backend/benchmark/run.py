@@ -0,0 +1,225 @@
+"""
+Concurrent HTTP driver for the layer routes and the JSON report it produces.
+"""
+
+import asyncio
+import csv
+import io
+import json
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+import httpx
+from benchmark.generate import LNG_RANGE, LAT_RANGE, WORDS
+from benchmark.stats import percentile
+
+ROUTES = ("load_layer", "search", "summarize_layer", "count_layer_by_formid", "save_layer", "upload")
+COUNT_QUERIES = [(groupby, kind) for groupby in ("day", "month", "year") for kind in ("count", "sum")]
+# Reads with too few distinct requests to vary; an untimed write before each
+# bumps the layer version so the timed read misses the response cache (their
+# throughput_rps includes those writes)
+CACHE_BUSTED = ("summarize_layer", "count_layer_by_formid")
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def _latency(samples: list):
+    if not samples:
+        return None
+    return {
+        "p50": _ms(percentile(samples, 50)),
+        "p95": _ms(percentile(samples, 95)),
+        "p99": _ms(percentile(samples, 99)),
+        "mean": _ms(statistics.fmean(samples)),
+        "max": _ms(max(samples)),
+    }
+
+
+def summarize(route: str, layer: dict, latencies: list, error_latencies: list, errors: int, elapsed: float) -> dict:
+    """Throughput and latency_ms cover successful requests; failed responses get error_latency_ms."""
+    return {
+        "route": route,
+        "geometry": layer["geometry"],
+        "rows": layer["rows"],
+        "requests": len(latencies) + errors,
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2) if elapsed > 0 else 0.0,
+        "latency_ms": _latency(latencies),
+        "error_latency_ms": _latency(error_latencies),
+    }
+
+
+class Scenario:
+    """Builds the n-th request for a route against one layer."""
+
+    def __init__(self, route: str, layer: dict, rng: random.Random, upload_rows: int):
+        self.route = route
+        self.layer = layer
+        self.rng = rng
+        self.upload_rows = upload_rows
+        self.formid = layer["formid"]
+        self.text_cols = [c["col_id"] for c in layer["columns"] if c["col_type"] == "text"]
+        self.numeric_cols = [c["col_id"] for c in layer["columns"] if c["col_type"] == "numeric"]
+        self.uploaded = []
+
+    def _bbox(self) -> str:
+        # A window of about 1 degree somewhere over the generated extent
+        x = self.rng.uniform(LNG_RANGE[0], LNG_RANGE[1] - 1)
+        y = self.rng.uniform(LAT_RANGE[0], LAT_RANGE[1] - 1)
+        return f"{x},{y},{x + 1},{y + 1}"
+
+    def _keyword(self) -> str:
+        return f"{self.rng.choice(WORDS)} {self.rng.randint(1, 999)}"
+
+    def _geojson(self) -> str:
+        x, y = self.rng.uniform(*LNG_RANGE), self.rng.uniform(*LAT_RANGE)
+        geometry = self.layer["geometry"]
+        if geometry == "point":
+            return json.dumps({"type": "Point", "coordinates": [x, y]})
+        if geometry == "linestring":
+            return json.dumps({"type": "LineString", "coordinates": [[x, y], [x + 0.01, y + 0.005]]})
+        ring = [[x, y], [x + 0.01, y], [x + 0.01, y + 0.01], [x, y + 0.01], [x, y]]
+        return json.dumps({"type": "Polygon", "coordinates": [ring]})
+
+    def _csv(self) -> bytes:
+        out = io.StringIO()
+        writer = csv.writer(out)
+        writer.writerow(["name", "lat", "lng", "amount"])
+        for i in range(self.upload_rows):
+            writer.writerow([
+                self._keyword(), round(self.rng.uniform(*LAT_RANGE), 6),
+                round(self.rng.uniform(*LNG_RANGE), 6), self.rng.randint(0, 1000),
+            ])
+        return out.getvalue().encode()
+
+    def _save(self) -> dict:
+        dataarr = [{"name": c, "value": self._keyword()} for c in self.text_cols]
+        dataarr += [{"name": c, "value": str(self.rng.randint(0, 1000))} for c in self.numeric_cols]
+        return {"url": "/api/save_layer", "json": {
+            "formid": self.formid, "geojson": self._geojson(), "dataarr": json.dumps(dataarr),
+        }}
+
+    def unsupported(self):
+        """Why this route cannot run against the layer, or None."""
+        if self.route == "search" and not self.text_cols:
+            return "the layer has no text columns"
+        return None
+
+    def prepare(self):
+        """Untimed request to send before the next one, or None."""
+        return self._save() if self.route in CACHE_BUSTED else None
+
+    def request(self) -> dict:
+        if self.route == "load_layer":
+            return {"url": "/api/load_layer", "json": {"formid": self.formid, "limit": 1000, "bbox": self._bbox()}}
+        if self.route == "search":
+            col = self.rng.choice(self.text_cols)
+            mode = self.rng.choice(["exact", "prefix"])
+            return {"url": "/api/search", "json": {
+                "formid": self.formid, "columnid": col, "keyword": self._keyword(), "mode": mode, "limit": 100,
+            }}
+        if self.route == "summarize_layer":
+            return {"url": "/api/summarize_layer", "json": {"formid": self.formid}}
+        if self.route == "count_layer_by_formid":
+            groupby, kind = self.rng.choice(COUNT_QUERIES)
+            if kind == "sum" and not self.numeric_cols:
+                kind = "count"
+            return {"url": "/api/count_layer_by_formid", "json": {
+                "formid": self.formid, "groupby": groupby, "type": kind,
+                "col_id": self.numeric_cols[0] if kind == "sum" else None,
+            }}
+        if self.route == "save_layer":
+            return self._save()
+        if self.route == "upload":
+            return {
+                "url": "/api/upload",
+                "data": {"division": "benchmark", "layername": "bench upload", "layertype": "point"},
+                "files": {"file": ("bench.csv", self._csv(), "text/csv")},
+            }
+        raise ValueError(f"Unknown route {self.route}")
+
+    def record(self, response: httpx.Response):
+        if self.route == "upload" and response.status_code == 200:
+            self.uploaded.append(response.json()["formid"])
+
+
+async def drive(client: httpx.AsyncClient, scenario: Scenario, requests: int, concurrency: int):
+    """Send `requests` requests with `concurrency` clients.
+
+    Return (latencies, error_latencies, errors, elapsed): latencies of
+    successful responses, latencies of 4xx/5xx ones, and the number of
+    failures including transport errors.
+    """
+    remaining = requests
+    latencies, error_latencies, errors = [], [], 0
+
+    async def worker():
+        nonlocal remaining, errors
+        while remaining > 0:
+            remaining -= 1
+            try:
+                if prep := scenario.prepare():
+                    (await client.post(**prep)).raise_for_status()
+                request = scenario.request()
+                started = time.perf_counter()
+                response = await client.post(**request)
+            except httpx.HTTPError:
+                errors += 1
+                continue
+            latency = time.perf_counter() - started
+            if response.status_code >= 400:
+                errors += 1
+                error_latencies.append(latency)
+            else:
+                latencies.append(latency)
+            scenario.record(response)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, requests))))
+    return latencies, error_latencies, errors, time.perf_counter() - started
+
+
+async def run_layer(client: httpx.AsyncClient, layer: dict, args) -> list:
+    results = []
+    for route in args.routes:
+        rng = random.Random(f"{args.seed}-{route}-{layer['geometry']}-{layer['rows']}")
+        scenario = Scenario(route, layer, rng, args.upload_rows)
+        if reason := scenario.unsupported():
+            print(f"  ⏭️  Skipping {route} on {layer['formid']}: {reason}", file=sys.stderr)
+            continue
+        heavy = route == "upload"
+        requests = args.upload_requests if heavy else args.requests
+        concurrency = min(args.concurrency, args.upload_concurrency) if heavy else args.concurrency
+        if args.warmup and not heavy:
+            await drive(client, scenario, args.warmup, concurrency)
+        latencies, error_latencies, errors, elapsed = await drive(client, scenario, requests, concurrency)
+        results.append(summarize(route, layer, latencies, error_latencies, errors, elapsed))
+        for formid in scenario.uploaded:
+            await client.post("/api/delete_layer", json={"formid": formid})
+    return results
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "url": args.url,
+        "seed": args.seed,
+        "concurrency": args.concurrency,
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "upload_rows": args.upload_rows,
+        "columns": args.columns,
+    }
@@ -0,0 +1,11 @@
+"""
+Latency statistics shared by the benchmark suite and the bench_*.py scripts.
+"""
+
+import math
+
+
+def percentile(samples: list, p: float) -> float:
+    """Nearest-rank percentile, p in 0-100: the smallest sample with at least p% of samples at or below it."""
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
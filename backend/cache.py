@@ -0,0 +1,61 @@
+from collections import OrderedDict
+from config import get_settings
+
+settings = get_settings()
+
+
+class ResponseCache:
+    """Byte-bounded LRU cache of serialized response bodies.
+
+    Keys carry the layer's change version, so a write makes the old
+    entries unreachable and they age out through normal eviction.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key, body: bytes, headers: dict = None):
+        if len(body) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.size -= len(old[0])
+        self._entries[key] = (body, headers or {})
+        self.size += len(body)
+        while self.size > self.max_bytes:
+            _, (evicted, _) = self._entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.size = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(settings.response_cache_bytes)
@@ -0,0 +1,214 @@
+import asyncio
+import logging
+import time
+import uuid
+import asyncpg
+from fastapi import HTTPException
+from config import get_settings
+import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+CHANNEL = "lgia_catalog"
+VERSION_CHANNEL = "lgia_layer_version"
+
+# Identifies this worker so it can ignore its own notifications
+_worker_id = uuid.uuid4().hex
+
+_layers = {}
+_columns = {}
+_versions = {}
+# formid -> monotonic time of its last version change seen by this worker
+_changed_at = {}
+_pool = None
+_listener = None
+
+
+async def ensure_schema(conn):
+    # Trigram indexes back the prefix/substring/fuzzy search modes
+    await conn.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+    await conn.execute(
+        """CREATE TABLE IF NOT EXISTS layer_version (
+            formid text PRIMARY KEY,
+            version bigint NOT NULL DEFAULT 0
+        )"""
+    )
+
+
+async def reload(conn=None):
+    """Reload layer_name, layer_column and layer_version into memory."""
+    global _layers, _columns, _versions
+    if conn is None:
+        async with _pool.acquire() as conn:
+            return await reload(conn)
+
+    layer_rows = await conn.fetch("SELECT * FROM layer_name")
+    column_rows = await conn.fetch("SELECT * FROM layer_column")
+    version_rows = await conn.fetch("SELECT formid, version FROM layer_version")
+
+    layers = {row["formid"]: dict(row) for row in layer_rows}
+    columns = {formid: [] for formid in layers}
+    for row in column_rows:
+        columns.setdefault(row["formid"], []).append(dict(row))
+
+    # A bump that committed while we were reading must not be rolled back
+    versions = {
+        row["formid"]: max(row["version"], _versions.get(row["formid"], 0))
+        for row in version_rows
+    }
+    now = time.monotonic()
+    for formid, version in versions.items():
+        if version > _versions.get(formid, 0):
+            _changed_at[formid] = now
+
+    # Swap the maps at once so readers never see a half-loaded catalog
+    _layers, _columns, _versions = layers, columns, versions
+    logger.info(f"Layer catalog loaded: {len(layers)} layers, {len(column_rows)} columns")
+
+
+async def invalidate(conn):
+    """Reload after a metadata change and tell the other workers to do the same."""
+    await reload(conn)
+    await conn.execute("SELECT pg_notify($1, $2)", CHANNEL, _worker_id)
+
+
+async def bump_version(conn, formid: str) -> int:
+    """Record a change to a layer's rows or schema.
+
+    Call inside the write's transaction so the new version commits with it,
+    then pass the result to set_version() once the transaction has committed.
+    """
+    version = await conn.fetchval(
+        """INSERT INTO layer_version (formid, version) VALUES ($1, 1)
+           ON CONFLICT (formid) DO UPDATE SET version = layer_version.version + 1
+           RETURNING version""",
+        formid
+    )
+    await conn.execute("SELECT pg_notify($1, $2)", VERSION_CHANNEL, f"{formid}:{version}")
+    return version
+
+
+def set_version(formid: str, version: int):
+    if version > _versions.get(formid, 0):
+        _versions[formid] = version
+        _changed_at[formid] = time.monotonic()
+
+
+def _on_version(conn, pid, channel, payload):
+    formid, _, version = payload.rpartition(":")
+    set_version(formid, int(version))
+
+
+def _on_notify(conn, pid, channel, payload):
+    if payload == _worker_id:
+        return
+    asyncio.get_running_loop().create_task(_safe_reload())
+
+
+async def _safe_reload():
+    try:
+        await reload()
+    except Exception as e:
+        logger.error(f"Layer catalog reload failed: {e}")
+
+
+def _on_terminate(conn):
+    logger.warning("Layer catalog listener disconnected, reconnecting...")
+    asyncio.get_running_loop().create_task(_listen(reconnect=True))
+
+
+async def _listen(reconnect=False):
+    global _listener
+    retry_delay = 2
+    while True:
+        try:
+            _listener = await asyncpg.connect(
+                host=settings.pg_host,
+                port=settings.pg_port,
+                user=settings.pg_user,
+                password=settings.pg_password,
+                database=settings.pg_name,
+            )
+            await _listener.add_listener(CHANNEL, _on_notify)
+            await _listener.add_listener(VERSION_CHANNEL, _on_version)
+            _listener.add_termination_listener(_on_terminate)
+            break
+        except (OSError, asyncpg.PostgresError) as e:
+            logger.warning(f"Layer catalog listener not ready, retrying in {retry_delay}s... ({e})")
+            await asyncio.sleep(retry_delay)
+    if reconnect:
+        # Notifications sent while disconnected are lost
+        await _safe_reload()
+
+
+async def start(pool):
+    global _pool
+    _pool = pool
+    async with pool.acquire() as conn:
+        await ensure_schema(conn)
+    await reload()
+    await _listen()
+
+
+async def stop():
+    global _listener
+    if _listener:
+        _listener.remove_termination_listener(_on_terminate)
+        await _listener.close()
+        _listener = None
+
+
+# ============ Lookups ============
+
+def get_layers():
+    return list(_layers.values())
+
+
+def get_layer(formid: str):
+    return _layers.get(formid)
+
+
+def get_columns(formid: str):
+    return _columns.get(formid, [])
+
+
+def column_types(formid: str):
+    return {col["col_id"]: col["col_type"] for col in get_columns(formid)}
+
+
+def get_version(formid: str) -> int:
+    return _versions.get(formid, 0)
+
+
+def recently_changed(formid: str) -> bool:
+    """True while a replica within the allowed lag may not have the layer's last change yet."""
+    changed = _changed_at.get(formid)
+    return changed is not None and time.monotonic() - changed <= settings.pg_replica_max_lag
+
+
+def find_column(col_id: str):
+    for columns in _columns.values():
+        for col in columns:
+            if col["col_id"] == col_id:
+                return col
+    return None
+
+
+# ============ Validation ============
+
+def require_layer(formid: str):
+    """Reject unknown layer tables before any dynamic SQL is built."""
+    layer = _layers.get(formid)
+    if layer is None:
+        raise HTTPException(status_code=404, detail="Layer not found")
+    metrics.label_formid(formid)
+    return layer
+
+
+def require_column(formid: str, col_id: str):
+    require_layer(formid)
+    for col in _columns.get(formid, []):
+        if col["col_id"] == col_id:
+            return col
+    raise HTTPException(status_code=400, detail=f"Unknown column: {col_id}")
@@ -1,5 +1,6 @@
 from pydantic_settings import BaseSettings
 from functools import lru_cache
+from typing import Optional
 
 
 class Settings(BaseSettings):
@@ -10,10 +11,44 @@ class Settings(BaseSettings):
     pg_name: str = "postgres"
     pg_port: int = 5432
 
+    # Connection pool; statement timeout in milliseconds, 0 disables it
+    pg_pool_min_size: int = 2
+    pg_pool_max_size: int = 10
+    pg_acquire_timeout: float = 10.0
+    pg_statement_cache_size: int = 100
+    pg_max_inactive_lifetime: float = 300.0
+    pg_statement_timeout: int = 60000
+    # Optional read replica for read-only routes; it is skipped while its
+    # replay lag exceeds pg_replica_max_lag seconds, and a layer written
+    # within that window is read from the primary
+    pg_replica_host: Optional[str] = None
+    pg_replica_port: int = 5432
+    pg_replica_max_lag: float = 5.0
+    pg_replica_check_interval: float = 2.0
+    # /health reports not ready once this many requests queue on a full pool
+    pg_ready_max_waiters: int = 0
+
     # JWT
     jwt_secret: str = "lgiadev"
     jwt_algorithm: str = "HS256"
     jwt_expire_minutes: int = 60
+    # Verified tokens are remembered for up to token_cache_ttl seconds (0 entries disables)
+    token_cache_size: int = 10000
+    token_cache_ttl: int = 300
+
+    # Password hashing: bcrypt runs on its own threads, excess logins queue
+    # up to bcrypt_max_queue deep and wait at most bcrypt_queue_timeout seconds
+    bcrypt_workers: int = 4
+    bcrypt_max_queue: int = 64
+    bcrypt_queue_timeout: float = 10.0
+
+    # Slow-query log; a sampled fraction of slow reads also gets EXPLAIN (ANALYZE, BUFFERS)
+    slow_query_ms: int = 500
+    slow_query_explain_rate: float = 0.0
+    slow_query_history: int = 200
+
+    # Response cache
+    response_cache_bytes: int = 64 * 1024 * 1024
 
     class Config:
         env_file = ".env"
@@ -1,12 +1,135 @@
 import asyncpg
 import asyncio
+import bisect
 import logging
+import time
+from contextlib import asynccontextmanager
+from fastapi import HTTPException
 from config import get_settings
+import metrics
+import querylog
 
 settings = get_settings()
 logger = logging.getLogger(__name__)
 
+# Upper bounds (seconds) of the acquire-wait histogram buckets
+ACQUIRE_WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Replay lag of a streaming replica; NULL when it is not a replica or has
+# replayed nothing yet, so the primary is used
+REPLICA_LAG_SQL = """
+    SELECT CASE WHEN NOT pg_is_in_recovery() THEN NULL
+                WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END
+"""
+
 _pool = None
+_replica = None
+_replica_lag = None
+_replica_monitor = None
+
+
+class Pool:
+    """asyncpg pool whose acquire() is bounded by a timeout and measured."""
+
+    def __init__(self, pool: asyncpg.Pool):
+        self._pool = pool
+        self.waiting = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.wait_seconds = 0.0
+        self._wait_counts = [0] * (len(ACQUIRE_WAIT_BUCKETS) + 1)
+
+    @asynccontextmanager
+    async def acquire(self, timeout: float = None):
+        started = time.perf_counter()
+        self.waiting += 1
+        try:
+            conn = await self._pool.acquire(timeout=timeout or settings.pg_acquire_timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise HTTPException(
+                status_code=503,
+                detail="Database busy, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - started
+        self.acquired += 1
+        self.wait_seconds += waited
+        self._wait_counts[bisect.bisect_left(ACQUIRE_WAIT_BUCKETS, waited)] += 1
+        metrics.observe_pool_wait(waited)
+        try:
+            yield conn
+        finally:
+            await self._pool.release(conn)
+
+    def saturated(self) -> bool:
+        return (
+            self._pool.get_idle_size() == 0
+            and self._pool.get_size() >= self._pool.get_max_size()
+            and self.waiting > settings.pg_ready_max_waiters
+        )
+
+    def stats(self) -> dict:
+        size = self._pool.get_size()
+        idle = self._pool.get_idle_size()
+        # Cumulative counts, each bucket holds the waits at or below its bound
+        histogram, total = {}, 0
+        for bound, count in zip([*map(str, ACQUIRE_WAIT_BUCKETS), "+Inf"], self._wait_counts):
+            total += count
+            histogram[bound] = total
+        return {
+            "size": size,
+            "min_size": self._pool.get_min_size(),
+            "max_size": self._pool.get_max_size(),
+            "in_use": size - idle,
+            "idle": idle,
+            "waiters": self.waiting,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "acquire_wait_seconds_sum": round(self.wait_seconds, 6),
+            "acquire_wait_histogram": histogram,
+        }
+
+    async def close(self):
+        await self._pool.close()
+
+
+async def _init_connection(conn):
+    conn.add_query_logger(metrics.observe_query)
+    conn.add_query_logger(querylog.observe)
+
+
+async def _create_pool(host: str, port: int) -> Pool:
+    pool = await asyncpg.create_pool(
+        host=host,
+        port=port,
+        user=settings.pg_user,
+        password=settings.pg_password,
+        database=settings.pg_name,
+        min_size=settings.pg_pool_min_size,
+        max_size=settings.pg_pool_max_size,
+        statement_cache_size=settings.pg_statement_cache_size,
+        max_inactive_connection_lifetime=settings.pg_max_inactive_lifetime,
+        server_settings={"statement_timeout": str(settings.pg_statement_timeout)},
+        init=_init_connection,
+    )
+    return Pool(pool)
+
+
+@asynccontextmanager
+async def advisory_lock(conn, key: int):
+    """Hold a session advisory lock on conn, waiting for any other holder to finish."""
+    async with conn.transaction():
+        # Another worker may hold it for a long startup build
+        await conn.execute("SET LOCAL statement_timeout = 0")
+        await conn.execute("SELECT pg_advisory_lock($1)", key)
+    try:
+        yield
+    finally:
+        await conn.execute("SELECT pg_advisory_unlock($1)", key)
 
 
 async def get_pool():
@@ -14,19 +137,11 @@ async def get_pool():
     if _pool is None:
         max_retries = 15
         retry_delay = 2
-        
+
         for attempt in range(max_retries):
             try:
                 logger.info(f"Connecting to database (attempt {attempt + 1}/{max_retries})...")
-                _pool = await asyncpg.create_pool(
-                    host=settings.pg_host,
-                    port=settings.pg_port,
-                    user=settings.pg_user,
-                    password=settings.pg_password,
-                    database=settings.pg_name,
-                    min_size=2,
-                    max_size=10,
-                )
+                _pool = await _create_pool(settings.pg_host, settings.pg_port)
                 logger.info("Database connection established successfully!")
                 break
             except (ConnectionRefusedError, asyncpg.exceptions.CannotConnectNowError, OSError) as e:
@@ -39,8 +154,58 @@ async def get_pool():
     return _pool
 
 
+async def get_read_pool():
+    """Pool for read-only queries: the replica while it is up and caught up, else the primary."""
+    if _replica is not None and _replica_lag is not None and _replica_lag <= settings.pg_replica_max_lag:
+        return _replica
+    return await get_pool()
+
+
+def replica_stats():
+    if not settings.pg_replica_host:
+        return None
+    return {
+        "host": settings.pg_replica_host,
+        "lag_seconds": _replica_lag,
+        "serving_reads": _replica_lag is not None and _replica_lag <= settings.pg_replica_max_lag,
+        "pool": _replica.stats() if _replica else None,
+    }
+
+
+async def _monitor_replica():
+    global _replica, _replica_lag
+    while True:
+        try:
+            if _replica is None:
+                _replica = await _create_pool(settings.pg_replica_host, settings.pg_replica_port)
+                logger.info("Read replica connected")
+            async with _replica.acquire(timeout=settings.pg_replica_check_interval) as conn:
+                lag = await conn.fetchval(REPLICA_LAG_SQL)
+            if lag is None and _replica_lag is not None:
+                logger.warning("Read replica is not replaying, reading from primary")
+            _replica_lag = None if lag is None else float(lag)
+        except (OSError, asyncio.TimeoutError, asyncpg.PostgresError, HTTPException) as e:
+            if _replica_lag is not None:
+                logger.warning(f"Read replica unavailable, reading from primary: {e}")
+            _replica_lag = None
+        await asyncio.sleep(settings.pg_replica_check_interval)
+
+
+def start_replica():
+    """Connect the optional read replica and keep checking its lag in the background."""
+    global _replica_monitor
+    if settings.pg_replica_host and _replica_monitor is None:
+        _replica_monitor = asyncio.get_running_loop().create_task(_monitor_replica())
+
+
 async def close_pool():
-    global _pool
+    global _pool, _replica, _replica_monitor
+    if _replica_monitor:
+        _replica_monitor.cancel()
+        _replica_monitor = None
+    if _replica:
+        await _replica.close()
+        _replica = None
     if _pool:
         await _pool.close()
         _pool = None
@@ -64,6 +64,15 @@ async def fix_layer_tables():
                 """)
                 print(f"  ✅ Created table: {formid}")
 
+            # Spatial index used by the bbox filters and vector tiles
+            await conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {formid}_geom_idx ON {formid} USING GIST (geom)"
+            )
+            # Keyset pagination index for the (ts DESC, id DESC) ordering
+            await conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {formid}_ts_idx ON {formid} (ts, id)"
+            )
+
             # Get column definitions
             columns = await conn.fetch(
                 "SELECT col_id, col_type FROM layer_column WHERE formid = $1",
@@ -1,17 +1,32 @@
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+import asyncpg
 
-from database import get_pool, close_pool
+from database import get_pool, close_pool, start_replica
 from routes import router
+import auth
+import catalog
+import metrics
+import rollups
+import search_index
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    await get_pool()
+    pool = await get_pool()
+    await catalog.start(pool)
+    await rollups.ensure_all(pool)
+    await search_index.ensure_all(pool)
+    search_index.start_repair()
+    start_replica()
     yield
     # Shutdown
+    await search_index.stop_repair()
+    await catalog.stop()
+    auth.shutdown()
     await close_pool()
 
 
@@ -29,8 +44,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Facet-Estimated", "ETag"],
 )
 
+app.add_middleware(metrics.MetricsMiddleware)
+
 # Include routes
 app.include_router(router)
 
@@ -42,4 +60,20 @@ async def root():
 
 @app.get("/health")
 async def health():
-    return {"status": "healthy"}
+    """Readiness probe: 503 while the pool is saturated or the database unreachable."""
+    pool = await get_pool()
+    stats = pool.stats()
+    if pool.saturated():
+        return JSONResponse({"status": "saturated", "pool": stats}, status_code=503)
+    try:
+        async with pool.acquire(timeout=1) as conn:
+            await conn.fetchval("SELECT 1")
+    except (HTTPException, OSError, asyncpg.PostgresError) as e:
+        return JSONResponse({"status": "unavailable", "error": str(e), "pool": stats}, status_code=503)
+    return {"status": "healthy", "pool": stats}
+
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    body, content_type = metrics.exposition()
+    return Response(body, media_type=content_type)
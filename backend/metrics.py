@@ -0,0 +1,130 @@
+import time
+from contextvars import ContextVar
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest
+
+LABELS = ["route", "formid"]
+
+REQUEST_SECONDS = Histogram(
+    "lgia_request_duration_seconds", "Request latency", ["route", "method", "status", "formid"],
+)
+RESPONSE_BYTES = Histogram(
+    "lgia_response_bytes", "Response body size", LABELS,
+    buckets=(1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8),
+)
+RESPONSE_ROWS = Histogram(
+    "lgia_response_rows", "Rows serialized into the response", LABELS,
+    buckets=(0, 1, 10, 100, 1e3, 1e4, 1e5, 1e6),
+)
+SQL_SECONDS = Histogram("lgia_sql_seconds", "Time spent in SQL per request", LABELS)
+SERIALIZE_SECONDS = Histogram("lgia_serialize_seconds", "Time spent serializing per request", LABELS)
+POOL_WAIT_SECONDS = Histogram("lgia_pool_acquire_wait_seconds", "Time waiting for a pool connection per request", LABELS)
+QUERIES = Counter("lgia_sql_queries_total", "Statements executed", LABELS)
+
+
+class RequestStats:
+    __slots__ = ("scope", "formid", "queries", "sql_seconds", "serialize_seconds", "rows", "pool_wait")
+
+    def __init__(self, scope: dict):
+        self.scope = scope
+        self.formid = ""
+        self.queries = 0
+        self.sql_seconds = 0.0
+        self.serialize_seconds = 0.0
+        self.rows = None
+        self.pool_wait = 0.0
+
+
+_current: ContextVar = ContextVar("request_stats", default=None)
+
+
+def current_route() -> tuple:
+    """(route template, formid) of the request being served, or (None, None)."""
+    stats = _current.get()
+    if stats is None:
+        return None, None
+    route = stats.scope.get("route")
+    return (route.path if route is not None else None), stats.formid or None
+
+
+def label_formid(formid: str):
+    stats = _current.get()
+    if stats is not None:
+        stats.formid = formid
+
+
+def observe_query(record):
+    """asyncpg query logger; runs in the context of the request that issued the query."""
+    stats = _current.get()
+    if stats is not None:
+        stats.queries += 1
+        stats.sql_seconds += record.elapsed
+
+
+def observe_pool_wait(seconds: float):
+    stats = _current.get()
+    if stats is not None:
+        stats.pool_wait += seconds
+
+
+def observe_serialization(seconds: float, rows: int = None):
+    stats = _current.get()
+    if stats is not None:
+        stats.serialize_seconds += seconds
+        if rows is not None:
+            stats.rows = (stats.rows or 0) + rows
+
+
+def add_rows(rows: int):
+    stats = _current.get()
+    if stats is not None:
+        stats.rows = (stats.rows or 0) + rows
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, size and time breakdown."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats(scope)
+        token = _current.set(stats)
+        started = time.perf_counter()
+        status = 500
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal status, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current.reset(token)
+            elapsed = time.perf_counter() - started
+            # Label by route template so path parameters don't explode cardinality
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            # Only catalog-validated layers get their own series; see label_formid
+            formid = stats.formid
+            REQUEST_SECONDS.labels(path, scope["method"], str(status), formid).observe(elapsed)
+            RESPONSE_BYTES.labels(path, formid).observe(size)
+            SQL_SECONDS.labels(path, formid).observe(stats.sql_seconds)
+            SERIALIZE_SECONDS.labels(path, formid).observe(stats.serialize_seconds)
+            POOL_WAIT_SECONDS.labels(path, formid).observe(stats.pool_wait)
+            if stats.queries:
+                QUERIES.labels(path, formid).inc(stats.queries)
+            if stats.rows is not None:
+                RESPONSE_ROWS.labels(path, formid).observe(stats.rows)
+
+
+def exposition() -> tuple:
+    return generate_latest(), CONTENT_TYPE_LATEST
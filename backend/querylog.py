@@ -0,0 +1,105 @@
+import asyncio
+import contextvars
+import logging
+import random
+import re
+import time
+from collections import deque
+import asyncpg
+from config import get_settings
+import metrics
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+MAX_PARAM_CHARS = 200
+EXPLAIN_TIMEOUT_MS = 30000
+
+# EXPLAIN ANALYZE runs the statement, so only plain reads are ever explained
+_READ_ONLY = re.compile(r"^\s*(SELECT|WITH)\b", re.IGNORECASE)
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|CREATE|DROP|ALTER|LOCK)\b", re.IGNORECASE)
+# Parameters of user-table statements carry password hashes and are never kept
+_SENSITIVE = re.compile(r"\btb_user\b", re.IGNORECASE)
+
+_history = deque(maxlen=settings.slow_query_history)
+_explaining = False
+
+
+def _short(value) -> str:
+    text = repr(value)
+    return text if len(text) <= MAX_PARAM_CHARS else text[:MAX_PARAM_CHARS] + "…"
+
+
+def observe(record):
+    """asyncpg query logger: keep statements slower than slow_query_ms."""
+    elapsed_ms = record.elapsed * 1000
+    if elapsed_ms < settings.slow_query_ms or record.query.lstrip().upper().startswith("EXPLAIN"):
+        return
+    route, formid = metrics.current_route()
+    entry = {
+        "ts": time.time(),
+        "elapsed_ms": round(elapsed_ms, 1),
+        "route": route,
+        "formid": formid,
+        "query": " ".join(record.query.split()),
+        "params": (
+            ["[redacted]"] * len(record.args or ()) if _SENSITIVE.search(record.query)
+            else [_short(arg) for arg in record.args or ()]
+        ),
+        "error": repr(record.exception) if record.exception else None,
+        "server": ":".join(map(str, record.conn_addr)) if isinstance(record.conn_addr, tuple) else str(record.conn_addr),
+        "plan": None,
+    }
+    _history.append(entry)
+    logger.warning(f"Slow query {entry['elapsed_ms']} ms on {route or '-'}: {entry['query'][:500]} {entry['params']}")
+
+    global _explaining
+    if (
+        random.random() < settings.slow_query_explain_rate
+        and not _explaining
+        and record.exception is None
+        and _READ_ONLY.match(record.query)
+        and not _WRITES.search(record.query)
+        and not _SENSITIVE.search(record.query)
+    ):
+        # One EXPLAIN at a time; a fresh context keeps it out of the request's metrics
+        _explaining = True
+        asyncio.get_running_loop().create_task(_explain(entry, record), context=contextvars.Context())
+
+
+async def _explain(entry: dict, record):
+    """Capture EXPLAIN (ANALYZE, BUFFERS) on the server that ran the statement."""
+    global _explaining
+    params = record.conn_params
+    host, port = record.conn_addr if isinstance(record.conn_addr, tuple) else (record.conn_addr, None)
+    try:
+        conn = await asyncpg.connect(
+            host=host,
+            port=port,
+            user=params.user,
+            password=params.password,
+            database=params.database,
+            server_settings={"statement_timeout": str(EXPLAIN_TIMEOUT_MS)},
+        )
+        try:
+            tr = conn.transaction(readonly=True)
+            await tr.start()
+            try:
+                rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {record.query}", *(record.args or ()))
+            finally:
+                await tr.rollback()
+        finally:
+            await conn.close()
+        entry["plan"] = "\n".join(row[0] for row in rows)
+    except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+        entry["plan"] = f"EXPLAIN failed: {e}"
+    finally:
+        _explaining = False
+
+
+def history(limit: int = 50, route: str = None, formid: str = None) -> list:
+    entries = [
+        e for e in reversed(_history)
+        if (route is None or e["route"] == route) and (formid is None or e["formid"] == formid)
+    ]
+    return entries[:limit]
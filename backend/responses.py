@@ -0,0 +1,38 @@
+import datetime
+import decimal
+import time
+import asyncpg
+import orjson
+from fastapi.responses import Response
+import metrics
+
+
+def _default(obj):
+    if isinstance(obj, asyncpg.Record):
+        return dict(obj)
+    if isinstance(obj, decimal.Decimal):
+        # Same convention as FastAPI's jsonable_encoder
+        if obj.is_finite() and obj.as_tuple().exponent >= 0:
+            return int(obj)
+        return float(obj)
+    if isinstance(obj, datetime.timedelta):
+        return obj.total_seconds()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content) -> bytes:
+    """Serialize lists of asyncpg Records (or plain data) straight to JSON bytes."""
+    return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+
+class RecordsResponse(Response):
+    """JSON response that skips jsonable_encoder and serializes Records with orjson."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        started = time.perf_counter()
+        body = dumps(content)
+        metrics.observe_serialization(
+            time.perf_counter() - started, len(content) if isinstance(content, list) else None
+        )
+        return body
@@ -0,0 +1,251 @@
+import logging
+import asyncpg
+import catalog
+from database import advisory_lock
+
+logger = logging.getLogger(__name__)
+
+# Advisory lock serialising ensure_all across workers
+ROLLUP_LOCK = 0x6c676972
+
+# Rollup rows are keyed by date(ts); the NULL bucket holds rows without ts.
+# Numeric columns keep a running SUM plus a non-null count (so an emptied
+# bucket reads back as NULL, like SUM over no values); every other column
+# keeps only its non-null count, which is what summarize_layer reports.
+
+
+def _table(formid: str) -> str:
+    return f"{formid}_daily"
+
+
+def _bucket_columns(columns: list):
+    """Return (definitions, names, aggregates) for a layer's rollup columns."""
+    defs, names, aggs = [], [], []
+    for col in columns:
+        c = col["col_id"]
+        if col["col_type"] == "numeric":
+            defs += [f"{c}_sum numeric NOT NULL DEFAULT 0", f"{c}_n bigint NOT NULL DEFAULT 0"]
+            names += [f"{c}_sum", f"{c}_n"]
+            aggs += [f"COALESCE(SUM({c}), 0)", f"COUNT({c})"]
+        else:
+            defs.append(f"{c}_n bigint NOT NULL DEFAULT 0")
+            names.append(f"{c}_n")
+            aggs.append(f"COUNT({c})")
+    return defs, names, aggs
+
+
+def _delta_sql(formid: str, names: list, aggs: list, source: str, sign: str) -> str:
+    table = _table(formid)
+    cols = "".join(f", {n}" for n in names)
+    values = "".join(f", {sign}{a}" for a in aggs)
+    updates = "".join(f", {n} = r.{n} + EXCLUDED.{n}" for n in names)
+    return f"""
+        INSERT INTO {table} AS r (d, n_rows{cols})
+        SELECT date(ts), {sign}COUNT(*){values} FROM {source} GROUP BY 1
+        ON CONFLICT (d) DO UPDATE SET n_rows = r.n_rows + EXCLUDED.n_rows{updates}"""
+
+
+async def build(conn, formid: str, columns: list):
+    """(Re)create the rollup table and its triggers from the current rows.
+
+    Run inside a transaction; the layer table stays write-locked until it
+    commits so no change can slip between the backfill and the triggers.
+    """
+    table = _table(formid)
+    defs, names, aggs = _bucket_columns(columns)
+    col_defs = "".join(f", {d}" for d in defs)
+    col_names = "".join(f", {n}" for n in names)
+    col_aggs = "".join(f", {a}" for a in aggs)
+
+    # The backfill scans the whole layer, so lift the per-statement limit
+    await conn.execute("SET LOCAL statement_timeout = 0")
+    await conn.execute(f"LOCK TABLE {formid} IN SHARE ROW EXCLUSIVE MODE")
+    await conn.execute(f"DROP FUNCTION IF EXISTS {formid}_rollup() CASCADE")
+    await conn.execute(f"DROP TABLE IF EXISTS {table}")
+    await conn.execute(
+        f"""CREATE TABLE {table} (
+            d date,
+            n_rows bigint NOT NULL DEFAULT 0{col_defs},
+            UNIQUE NULLS NOT DISTINCT (d)
+        )"""
+    )
+    await conn.execute(
+        f"""INSERT INTO {table} (d, n_rows{col_names})
+            SELECT date(ts), COUNT(*){col_aggs} FROM {formid} GROUP BY 1"""
+    )
+    await conn.execute(
+        f"""CREATE FUNCTION {formid}_rollup() RETURNS trigger LANGUAGE plpgsql AS $fn$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    {_delta_sql(formid, names, aggs, 'old_rows', '-')};
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    {_delta_sql(formid, names, aggs, 'new_rows', '')};
+                END IF;
+                DELETE FROM {table} WHERE n_rows = 0;
+                RETURN NULL;
+            END
+            $fn$"""
+    )
+    for suffix, event, transitions in [
+        ("ins", "INSERT", "NEW TABLE AS new_rows"),
+        ("upd", "UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("del", "DELETE", "OLD TABLE AS old_rows"),
+    ]:
+        await conn.execute(
+            f"""CREATE TRIGGER {formid}_rollup_{suffix} AFTER {event} ON {formid}
+                REFERENCING {transitions}
+                FOR EACH STATEMENT EXECUTE FUNCTION {formid}_rollup()"""
+        )
+
+
+async def drop(conn, formid: str):
+    await conn.execute(f"DROP FUNCTION IF EXISTS {formid}_rollup() CASCADE")
+    await conn.execute(f"DROP TABLE IF EXISTS {_table(formid)}")
+
+
+async def ensure_all(pool):
+    """Build rollups for layers created before rollups existed.
+
+    Every worker runs this at startup; one builds while the rest wait for
+    the lock and then find nothing left to build.
+    """
+    async with pool.acquire() as conn, advisory_lock(conn, ROLLUP_LOCK):
+        rows = await conn.fetch(
+            """SELECT formid FROM layer_name
+               WHERE to_regclass(formid) IS NOT NULL
+                 AND to_regclass(formid || '_daily') IS NULL"""
+        )
+        for row in rows:
+            formid = row["formid"]
+            try:
+                async with conn.transaction():
+                    await build(conn, formid, catalog.get_columns(formid))
+                logger.info(f"Built rollup for {formid}")
+            except asyncpg.PostgresError as e:
+                logger.warning(f"Could not build rollup for {formid}: {e}")
+
+
+# ============ Queries ============
+
+async def count_series(conn, formid: str, groupby: str, kind: str, col_id: str = None):
+    """Answer count_layer_by_formid from the rollup, or None to fall back to the layer table."""
+    table = _table(formid)
+    if kind == "count":
+        day_val = "CASE WHEN d IS NULL THEN 0 ELSE n_rows END"
+        agg_val = "(CASE WHEN b IS NULL THEN 0 ELSE SUM(n_rows) END)::bigint"
+        source_cols = "n_rows"
+    elif kind == "sum" and col_id and catalog.column_types(formid).get(col_id) == "numeric":
+        day_val = f"CASE WHEN {col_id}_n > 0 THEN {col_id}_sum END"
+        agg_val = f"CASE WHEN SUM({col_id}_n) > 0 THEN SUM({col_id}_sum) END"
+        source_cols = f"{col_id}_sum, {col_id}_n"
+    else:
+        return None
+
+    if groupby == "day":
+        sql = f"SELECT {day_val} AS val, d AS dt FROM {table}"
+    elif groupby == "month":
+        sql = f"""SELECT {agg_val} AS val, to_char(b, 'YYYY-MM') AS dt
+                  FROM (SELECT DATE_TRUNC('month', d::timestamp) AS b, {source_cols} FROM {table}) tb
+                  GROUP BY b ORDER BY b ASC"""
+    elif groupby == "year":
+        sql = f"""SELECT {agg_val} AS val, b AS dt
+                  FROM (SELECT DATE_TRUNC('year', d::timestamp) AS b, {source_cols} FROM {table}) tb
+                  GROUP BY b ORDER BY b ASC"""
+    else:
+        return None
+    return await _fetch(conn, sql)
+
+
+async def monthly_summary(conn, formid: str, columns: list):
+    """Answer summarize_layer from the rollup, or None to fall back to the layer table."""
+    col_exprs = []
+    for col in columns:
+        c = col["col_id"]
+        if col["col_type"] == "numeric":
+            col_exprs.append(f"CASE WHEN SUM({c}_n) > 0 THEN SUM({c}_sum) END as {c}")
+        else:
+            col_exprs.append(f"SUM({c}_n)::bigint as {c}")
+    sql = f"""
+        SELECT to_char(b, 'YYYY-MM') AS dt, {', '.join(col_exprs)}
+        FROM (SELECT DATE_TRUNC('month', d::timestamp) AS b, * FROM {_table(formid)}) tb
+        GROUP BY b
+    """
+    return await _fetch(conn, sql)
+
+
+async def time_stats(conn, formid: str, col_ids: list, start=None, end=None, fill: bool = True):
+    """Day, month and year series of count and numeric sums in one scan.
+
+    Reads the rollup when it exists and the layer table otherwise; rows
+    without ts belong to no period and are left out.
+    """
+    sums = "".join(f", {c}_sum, {c}_n" for c in col_ids)
+    sql = _time_stats_sql(
+        f"SELECT d, n_rows{sums} FROM {_table(formid)} WHERE d IS NOT NULL", col_ids, fill
+    )
+    rows = await _fetch(conn, sql, start, end)
+    if rows is None:
+        raw = "".join(f", {c} AS {c}_sum, ({c} IS NOT NULL)::int AS {c}_n" for c in col_ids)
+        sql = _time_stats_sql(
+            f"SELECT date(ts) AS d, 1 AS n_rows{raw} FROM {formid} WHERE ts IS NOT NULL", col_ids, fill
+        )
+        rows = await conn.fetch(sql, start, end)
+    return rows
+
+
+async def date_range(conn, formid: str):
+    """(first, last) day with recorded features, or (None, None) for an empty layer."""
+    row = await _fetch(conn, f"SELECT MIN(d) AS first, MAX(d) AS last FROM {_table(formid)}")
+    if row is None:
+        row = await conn.fetch(f"SELECT date(MIN(ts)) AS first, date(MAX(ts)) AS last FROM {formid}")
+    return row[0]["first"], row[0]["last"]
+
+
+def _time_stats_sql(source: str, col_ids: list, fill: bool) -> str:
+    sums = "".join(f", CASE WHEN SUM({c}_n) > 0 THEN SUM({c}_sum) END AS {c}" for c in col_ids)
+    stats = f"""
+        SELECT CASE WHEN GROUPING(d) = 0 THEN 'day' WHEN GROUPING(m) = 0 THEN 'month' ELSE 'year' END AS grain,
+               COALESCE(d, m, y) AS dt, SUM(n_rows)::bigint AS count{sums}
+        FROM (SELECT *, DATE_TRUNC('month', d::timestamp)::date AS m,
+                        DATE_TRUNC('year', d::timestamp)::date AS y
+              FROM ({source}) src
+              WHERE ($1::date IS NULL OR d >= $1) AND ($2::date IS NULL OR d <= $2)) t
+        GROUP BY GROUPING SETS ((d), (m), (y))"""
+    if not fill:
+        body = f"SELECT * FROM ({stats}) st"
+    else:
+        # Every period between the bounds, with zero counts where nothing was recorded
+        cols = "".join(f", st.{c}" for c in col_ids)
+        body = f"""
+            WITH st AS ({stats}),
+            bounds AS (
+                SELECT COALESCE($1::date, MIN(dt))::timestamp AS lo, COALESCE($2::date, MAX(dt))::timestamp AS hi
+                FROM st WHERE grain = 'day'
+            ),
+            slots AS (
+                SELECT 'day' AS grain, g::date AS dt FROM bounds, generate_series(lo, hi, interval '1 day') g
+                UNION ALL
+                SELECT 'month', g::date FROM bounds, generate_series(DATE_TRUNC('month', lo), hi, interval '1 month') g
+                UNION ALL
+                SELECT 'year', g::date FROM bounds, generate_series(DATE_TRUNC('year', lo), hi, interval '1 year') g
+            )
+            SELECT s.grain, s.dt, COALESCE(st.count, 0) AS count{cols}
+            FROM slots s LEFT JOIN st USING (grain, dt)"""
+    outputs = "".join(f", {c}" for c in col_ids)
+    return f"""
+        SELECT grain, CASE grain WHEN 'day' THEN to_char(dt, 'YYYY-MM-DD')
+                                 WHEN 'month' THEN to_char(dt, 'YYYY-MM')
+                                 ELSE to_char(dt, 'YYYY') END AS dt,
+               count{outputs}
+        FROM ({body}) r
+        ORDER BY grain, r.dt"""
+
+
+async def _fetch(conn, sql: str, *args):
+    try:
+        return await conn.fetch(sql, *args)
+    except (asyncpg.UndefinedTableError, asyncpg.UndefinedColumnError) as e:
+        # Rollup missing or out of step with the layer schema
+        logger.warning(f"Rollup query failed, using layer table: {e}")
+        return None
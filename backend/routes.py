@@ -1,15 +1,62 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends
+from fastapi import APIRouter, HTTPException, UploadFile, File, Form, Depends, Header, Response
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Any
+from typing import Optional, List, Tuple, Any
+from datetime import date, datetime
+import base64
+import hashlib
+import itertools
+import json
+import math
 import time
 import csv
 import io
-
-from database import get_pool
-from auth import verify_password, get_password_hash, create_access_token, verify_token
+import asyncio
+import asyncpg
+import numpy as np
+
+from database import get_pool, get_read_pool, replica_stats
+import catalog
+import metrics
+import querylog
+import rollups
+import search_index
+import utm
+from responses import RecordsResponse
+from cache import response_cache
+from auth import check_password, hash_password, create_access_token, verify_token, require_admin, bcrypt_stats
 
 router = APIRouter(prefix="/api")
 
+STREAM_CHUNK_SIZE = 1000
+MAX_PAGE_SIZE = 5000
+MAX_BATCH_SIZE = 1000
+SIMPLIFY_PIXELS = 0.5
+POINT_TYPES = ("point", "multipoint")
+BASE_COLUMNS = ["id", "refid", "ts", "style"]
+SEARCH_MODES = ("exact", "prefix", "substring", "fuzzy")
+SEARCH_LIMIT = 50
+MAX_TRANSFORM_POINTS = 100_000
+UTM_BATCH_SIZE = 10_000
+TRANSFORM_DIRECTIONS = ("to_wgs84", "from_wgs84")
+FACET_LIMIT = 100
+# Longest start..end span time_stats will fill with empty periods
+TIME_STATS_MAX_DAYS = 100 * 366
+# Above this many rows facets of text columns are estimated from pg_stats,
+# listing values from a block sample of about FACET_SAMPLE_ROWS rows when
+# the column has no most-common values
+FACET_EXACT_ROWS = 200_000
+FACET_SAMPLE_ROWS = 50_000
+
+LATLNG_COLUMN_NAMES = {
+    "ละติจูด": "lat", "latitude": "lat", "lat": "lat",
+    "ลองจิจูด": "lng", "longitude": "lng", "long": "lng", "lng": "lng",
+}
+UTM_COLUMN_NAMES = {
+    "x": "utm_e", "e": "utm_e", "easting": "utm_e", "utm_x": "utm_e",
+    "y": "utm_n", "n": "utm_n", "northing": "utm_n", "utm_y": "utm_n",
+}
+
 
 # ============ Pydantic Models ============
 
@@ -29,14 +76,31 @@ class FormIdRequest(BaseModel):
     formid: str
 
 
+class LoadLayerRequest(BaseModel):
+    formid: str
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+    bbox: Optional[str] = None
+    zoom: Optional[int] = None
+    tolerance: Optional[float] = None
+    precision: Optional[int] = None
+    fields: Optional[List[str]] = None
+    lite: bool = False
+
+
 class LayerByIdRequest(BaseModel):
     formid: str
     id: int
+    fields: Optional[List[str]] = None
+    lite: bool = False
 
 
 class ColumnRequest(BaseModel):
     formid: str
     columnid: str
+    limit: Optional[int] = None
+    prefix: Optional[str] = None
+    exact: bool = False
 
 
 class CreateTableRequest(BaseModel):
@@ -52,6 +116,17 @@ class SaveLayerRequest(BaseModel):
     dataarr: str
 
 
+class BatchFeature(BaseModel):
+    geojson: str
+    dataarr: str
+    style: Optional[str] = None
+
+
+class SaveLayerBatchRequest(BaseModel):
+    formid: str
+    features: List[BatchFeature]
+
+
 class UpdateLayerRequest(BaseModel):
     formid: str
     id: int
@@ -92,6 +167,21 @@ class SearchRequest(BaseModel):
     formid: str
     columnid: str
     keyword: str
+    limit: Optional[int] = None
+    cursor: Optional[str] = None
+    bbox: Optional[str] = None
+    zoom: Optional[int] = None
+    tolerance: Optional[float] = None
+    precision: Optional[int] = None
+    fields: Optional[List[str]] = None
+    lite: bool = False
+    mode: str = "exact"
+
+
+class GlobalSearchRequest(BaseModel):
+    keyword: str
+    limit: int = SEARCH_LIMIT
+    fuzzy: bool = False
 
 
 class CountLayerRequest(BaseModel):
@@ -101,6 +191,20 @@ class CountLayerRequest(BaseModel):
     col_id: Optional[str] = None
 
 
+class TimeStatsRequest(BaseModel):
+    formid: str
+    col_ids: Optional[List[str]] = None
+    start: Optional[date] = None
+    end: Optional[date] = None
+    fill: bool = True
+
+
+class UtmTransformRequest(BaseModel):
+    points: List[Tuple[float, float]]
+    epsg: int = 32647
+    direction: str = "to_wgs84"
+
+
 class ListLayerByDivRequest(BaseModel):
     auth: str
     division: str
@@ -118,10 +222,203 @@ class DeleteUserRequest(BaseModel):
     id: int
 
 
+# ============ Paging Helpers ============
+
+def _encode_cursor(row) -> str:
+    ts = row["ts"]
+    payload = json.dumps([ts.isoformat() if ts else None, row["id"]])
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+
+def _decode_cursor(token: str):
+    try:
+        ts, last_id = json.loads(base64.urlsafe_b64decode(token.encode()))
+        return (datetime.fromisoformat(ts) if ts else None), int(last_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def _parse_bbox(bbox: str):
+    try:
+        parts = [float(v) for v in bbox.split(",")]
+    except ValueError:
+        parts = []
+    if len(parts) != 4:
+        raise HTTPException(status_code=400, detail="bbox must be minx,miny,maxx,maxy")
+    return parts
+
+
+def _page_filters(req, conditions: list, args: list):
+    """Append bbox and keyset conditions for a (ts DESC, id DESC) ordered read."""
+    if req.bbox:
+        args.extend(_parse_bbox(req.bbox))
+        n = len(args)
+        conditions.append(f"geom && ST_MakeEnvelope(${n - 3}, ${n - 2}, ${n - 1}, ${n}, 4326)")
+    if req.cursor:
+        ts, last_id = _decode_cursor(req.cursor)
+        if ts is None:
+            # NULL timestamps sort first under DESC, so the remaining rows are
+            # the NULL ones with a lower id followed by every dated row
+            args.append(last_id)
+            conditions.append(f"((ts IS NULL AND id < ${len(args)}) OR ts IS NOT NULL)")
+        else:
+            args.extend([ts, last_id])
+            conditions.append(f"(ts, id) < (${len(args) - 1}, ${len(args)})")
+
+
+def _geojson_expr(req, layertype: str, args: list) -> str:
+    """ST_AsGeoJSON expression simplified and rounded for the requested zoom.
+
+    A simplify tolerance is appended to args and bound as a parameter.
+    """
+    if req.zoom is not None and not 0 <= req.zoom <= 22:
+        raise HTTPException(status_code=400, detail="zoom must be between 0 and 22")
+    if req.precision is not None and not 0 <= req.precision <= 15:
+        raise HTTPException(status_code=400, detail="precision must be between 0 and 15")
+    if req.tolerance is not None and not (math.isfinite(req.tolerance) and req.tolerance >= 0):
+        raise HTTPException(status_code=400, detail="tolerance must be a finite, non-negative number")
+
+    tolerance, precision = req.tolerance, req.precision
+    if req.zoom is not None:
+        # Degrees covered by one 256px-tile pixel at this zoom
+        pixel = 360.0 / (256 * 2 ** req.zoom)
+        if tolerance is None:
+            tolerance = SIMPLIFY_PIXELS * pixel
+        if precision is None:
+            precision = min(15, math.ceil(-math.log10(pixel)) + 1)
+
+    geom = "geom"
+    if tolerance and (layertype or "").lower() not in POINT_TYPES:
+        args.append(float(tolerance))
+        geom = f"ST_SimplifyPreserveTopology(geom, ${len(args)}::float8)"
+    if precision is None:
+        return f"ST_AsGeoJSON({geom})"
+    return f"ST_AsGeoJSON({geom}, {int(precision)})"
+
+
+async def _fetch_page(conn, sql: str, conditions: list, args: list, req):
+    """Run a paged read, returning the rows and the response headers to send."""
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    sql += " ORDER BY ts DESC, id DESC"
+    if req.limit is None:
+        return await conn.fetch(sql, *args), {}
+
+    if req.limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    limit = min(req.limit, MAX_PAGE_SIZE)
+    rows = await conn.fetch(sql + f" LIMIT {limit + 1}", *args)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, {"X-Next-Cursor": _encode_cursor(rows[-1])}
+    return rows, {}
+
+
+# ============ Versioning Helpers ============
+
+async def _read_pool(formid: str = None):
+    """Pool for a read-only route: the replica, unless the layer changed too recently for it."""
+    if formid and catalog.recently_changed(formid):
+        return await get_pool()
+    return await get_read_pool()
+
+
+def _layer_etag(formid: str, params: str) -> str:
+    """Weak ETag from the layer's change version and the request parameters."""
+    digest = hashlib.sha1(params.encode()).hexdigest()[:16]
+    return f'W/"{catalog.get_version(formid)}-{digest}"'
+
+
+def _not_modified(if_none_match: Optional[str], etag: str):
+    if not if_none_match:
+        return None
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if "*" in tags or etag.removeprefix("W/") in tags:
+        return Response(status_code=304, headers={"ETag": etag})
+    return None
+
+
+def _cache_key(name: str, req) -> tuple:
+    # Read the version before querying so a concurrent write can only make
+    # the cached body newer than its key, never older
+    return (req.formid, catalog.get_version(req.formid), name, req.model_dump_json())
+
+
+def _cached_response(key: tuple, etag: str):
+    entry = response_cache.get(key)
+    if entry is None:
+        return None
+    body, headers = entry
+    return Response(body, media_type="application/json", headers={**headers, "ETag": etag})
+
+
+def _store_response(key: tuple, rows, headers: dict, etag: str) -> Response:
+    response = RecordsResponse(rows, headers={**headers, "ETag": etag})
+    response_cache.put(key, response.body, headers)
+    return response
+
+
+# ============ Attribute Helpers ============
+
+def _pg_type(col_type: str) -> str:
+    # Image ("file") columns hold base64 text
+    return "text" if col_type == "file" else col_type
+
+
+def _projection(req, formid: str) -> str:
+    """Select list for a layer read; raw geom is never included."""
+    columns = catalog.get_columns(formid)
+    if req.fields is not None:
+        known = BASE_COLUMNS + [col["col_id"] for col in columns]
+        unknown = [f for f in req.fields if f not in known]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown column: {unknown[0]}")
+        attrs = [col["col_id"] for col in columns if col["col_id"] in req.fields]
+    elif req.lite:
+        attrs = [col["col_id"] for col in columns if col["col_type"] != "file"]
+    else:
+        attrs = [col["col_id"] for col in columns]
+    return ", ".join(BASE_COLUMNS + attrs)
+
+
+def _coerce_attributes(data_arr: list, column_types: dict) -> dict:
+    """Convert submitted form values to the Python types asyncpg expects.
+
+    Empty values are left out (but "0" is kept); date and numeric values
+    that fail to parse are skipped, matching the old per-column updates.
+    """
+    values = {}
+    for e in data_arr:
+        val = e.get("value", "")
+        col_name = e["name"]
+        if col_name not in column_types:
+            raise HTTPException(status_code=400, detail=f"Unknown column: {col_name}")
+        col_type = column_types[col_name]
+
+        if not val and val != "0":
+            continue
+
+        if col_type == "date":
+            try:
+                values[col_name] = datetime.strptime(val, "%Y-%m-%d").date()
+            except (ValueError, TypeError):
+                pass
+        elif col_type == "numeric":
+            try:
+                values[col_name] = float(val)
+            except (ValueError, TypeError):
+                pass
+        else:
+            values[col_name] = str(val)
+    return values
+
+
 # ============ Auth Endpoints ============
 
 @router.post("/register")
 async def register(req: RegisterRequest):
+    # Hash before taking a connection so queued logins never hold one
+    hashed = await hash_password(req.password)
     pool = await get_pool()
     async with pool.acquire() as conn:
         existing = await conn.fetchrow(
@@ -130,7 +427,6 @@ async def register(req: RegisterRequest):
         if existing:
             return {"status": "error", "message": "existing user"}
 
-        hashed = get_password_hash(req.password)
         await conn.execute(
             """INSERT INTO tb_user (username, email, division, pass, auth, ts) 
                VALUES ($1, $2, $3, $4, 'user', now())""",
@@ -146,20 +442,23 @@ async def login(req: LoginRequest):
         user = await conn.fetchrow(
             "SELECT auth, pass, division FROM tb_user WHERE username = $1", req.username
         )
-        if not user:
-            raise HTTPException(status_code=400, detail="Cannot find user")
+    if not user:
+        raise HTTPException(status_code=400, detail="Cannot find user")
 
-        if not verify_password(req.password, user["pass"]):
-            raise HTTPException(status_code=405, detail="ชื่อหรือรหัสผ่านไม่ถูกต้อง")
+    # Verify after releasing the connection so queued logins never hold one
+    if not await check_password(req.password, user["pass"]):
+        raise HTTPException(status_code=405, detail="ชื่อหรือรหัสผ่านไม่ถูกต้อง")
 
-        access_token = create_access_token(data={"username": req.username})
-        return {
-            "status": "success",
-            "username": req.username,
-            "role": user["auth"],
-            "division": user["division"],
-            "token": access_token
-        }
+    access_token = create_access_token(
+        data={"username": req.username, "role": user["auth"], "division": user["division"]}
+    )
+    return {
+        "status": "success",
+        "username": req.username,
+        "role": user["auth"],
+        "division": user["division"],
+        "token": access_token
+    }
 
 
 @router.post("/verify_token")
@@ -171,87 +470,328 @@ async def verify_token_endpoint(user: dict = Depends(verify_token)):
 
 @router.post("/list_layer")
 async def list_layer():
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        rows = await conn.fetch("SELECT * FROM layer_name")
-        return [dict(row) for row in rows]
+    return catalog.get_layers()
 
 
 @router.post("/list_layer_by_division")
 async def list_layer_by_division(req: ListLayerByDivRequest):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        if req.auth == "admin":
-            rows = await conn.fetch("SELECT * FROM layer_name")
-        elif req.auth == "user":
-            return []
-        else:
-            rows = await conn.fetch(
-                "SELECT * FROM layer_name WHERE division = $1", req.division
-            )
-        return [dict(row) for row in rows]
+    if req.auth == "admin":
+        return catalog.get_layers()
+    elif req.auth == "user":
+        return []
+    return [layer for layer in catalog.get_layers() if layer["division"] == req.division]
 
 
 @router.post("/get_layer_description")
 async def get_layer_description(req: FormIdRequest):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT * FROM layer_name WHERE formid = $1", req.formid
-        )
-        return [dict(row) for row in rows]
+    layer = catalog.get_layer(req.formid)
+    return [layer] if layer else []
 
 
 @router.post("/load_column_description")
-async def load_column_description(req: FormIdRequest):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT * FROM layer_column WHERE formid = $1", req.formid
-        )
-        return [dict(row) for row in rows]
+async def load_column_description(req: FormIdRequest, if_none_match: Optional[str] = Header(None)):
+    etag = _layer_etag(req.formid, req.model_dump_json())
+    return _not_modified(if_none_match, etag) or RecordsResponse(
+        catalog.get_columns(req.formid), headers={"ETag": etag}
+    )
 
 
 @router.post("/load_layer")
-async def load_layer(req: FormIdRequest):
-    pool = await get_pool()
+async def load_layer(req: LoadLayerRequest, if_none_match: Optional[str] = Header(None)):
+    layer = catalog.require_layer(req.formid)
+    key = _cache_key("load_layer", req)
+    etag = _layer_etag(req.formid, req.model_dump_json())
+    if cached := _not_modified(if_none_match, etag) or _cached_response(key, etag):
+        return cached
+    columns = _projection(req, req.formid)
+    conditions, args = [], []
+    geojson = _geojson_expr(req, layer["layertype"], args)
+    _page_filters(req, conditions, args)
+    pool = await _read_pool(req.formid)
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            f"SELECT *, ST_AsGeoJSON(geom) as geojson FROM {req.formid} ORDER BY ts DESC"
+        rows, headers = await _fetch_page(
+            conn, f"SELECT {columns}, {geojson} as geojson FROM {req.formid}",
+            conditions, args, req
         )
-        return [dict(row) for row in rows]
+    return _store_response(key, rows, headers, etag)
+
+
+@router.post("/load_layer_stream")
+async def load_layer_stream(req: FormIdRequest, if_none_match: Optional[str] = Header(None)):
+    catalog.require_layer(req.formid)
+    etag = _layer_etag(req.formid, "stream")
+    if cached := _not_modified(if_none_match, etag):
+        return cached
+    pool = await _read_pool(req.formid)
+
+    async def features():
+        # The connection stays checked out for the lifetime of the response
+        async with pool.acquire() as conn:
+            async with conn.transaction():
+                yield '{"type":"FeatureCollection","features":['
+                buf = []
+                first = True
+                async for row in conn.cursor(
+                    f"SELECT ST_AsGeoJSON(t.*) AS feature FROM {req.formid} t ORDER BY ts DESC",
+                    prefetch=STREAM_CHUNK_SIZE
+                ):
+                    buf.append(row["feature"] if first else "," + row["feature"])
+                    first = False
+                    if len(buf) >= STREAM_CHUNK_SIZE:
+                        metrics.add_rows(len(buf))
+                        yield "".join(buf)
+                        buf = []
+                if buf:
+                    metrics.add_rows(len(buf))
+                    yield "".join(buf)
+                yield "]}"
+
+    return StreamingResponse(features(), media_type="application/geo+json", headers={"ETag": etag})
 
 
 @router.post("/load_layer_by_id")
-async def load_layer_by_id(req: LayerByIdRequest):
+async def load_layer_by_id(req: LayerByIdRequest, if_none_match: Optional[str] = Header(None)):
+    catalog.require_layer(req.formid)
+    etag = _layer_etag(req.formid, req.model_dump_json())
+    if cached := _not_modified(if_none_match, etag):
+        return cached
+    columns = _projection(req, req.formid)
     pool = await get_pool()
     async with pool.acquire() as conn:
         rows = await conn.fetch(
-            f"SELECT *, ST_AsGeoJSON(geom) as geojson FROM {req.formid} WHERE id = $1",
+            f"SELECT {columns}, ST_AsGeoJSON(geom) as geojson FROM {req.formid} WHERE id = $1",
             req.id
         )
-        return [dict(row) for row in rows]
+        return RecordsResponse(rows, headers={"ETag": etag})
 
 
 @router.post("/load_by_column_id")
-async def load_by_column_id(req: ColumnRequest):
-    pool = await get_pool()
+async def load_by_column_id(req: ColumnRequest, if_none_match: Optional[str] = Header(None)):
+    col = catalog.require_column(req.formid, req.columnid)
+    key = _cache_key("load_by_column_id", req)
+    etag = _layer_etag(req.formid, req.model_dump_json())
+    if cached := _not_modified(if_none_match, etag) or _cached_response(key, etag):
+        return cached
+    limit = min(req.limit or FACET_LIMIT, MAX_PAGE_SIZE)
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+    is_text = col["col_type"] in search_index.TEXT_TYPES
+
+    pool = await _read_pool(req.formid)
     async with pool.acquire() as conn:
+        if is_text and not req.prefix and not req.exact:
+            estimate = await _estimate_facets(conn, req.formid, req.columnid, limit)
+            if estimate is not None:
+                rows, kind = estimate
+                return _store_response(key, rows, {"X-Facet-Estimated": kind}, etag)
+
+        conditions, args = [], []
+        if req.prefix:
+            pattern = search_index.like_escape(req.prefix)
+            args.append(pattern + "%")
+            if is_text:
+                conditions.append(f"{req.columnid} ILIKE $1")
+            else:
+                conditions.append(f"{req.columnid}::text ILIKE $1")
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
         rows = await conn.fetch(
-            f"SELECT DISTINCT {req.columnid} FROM {req.formid}"
+            f"""SELECT {req.columnid}, COUNT(*) AS count FROM {req.formid} {where}
+                GROUP BY 1 ORDER BY count DESC, 1 LIMIT {limit}""",
+            *args
         )
-        return [dict(row) for row in rows]
+    return _store_response(key, rows, {}, etag)
+
+
+async def _estimate_facets(conn, formid: str, col_id: str, limit: int):
+    """Top values and estimated counts for a large table, as (rows, X-Facet-Estimated value).
+
+    Counts are the planner's estimates from pg_stats: most_common_freqs for
+    its most common values, and for any other value the remaining rows
+    spread evenly over the remaining n_distinct values. A block sample lists
+    those other values and weeds out MCV entries that were only common in
+    ANALYZE's sample. Without column statistics the raw sample counts are
+    returned, marked "sample". Returns None when the table is small enough
+    to count exactly.
+    """
+    stats = await conn.fetchrow(
+        """SELECT c.reltuples, s.most_common_vals::text::text[] AS vals, s.most_common_freqs AS freqs,
+                  s.n_distinct, s.null_frac
+           FROM pg_class c
+           LEFT JOIN pg_stats s ON s.schemaname = current_schema() AND s.tablename = $1 AND s.attname = $2
+           WHERE c.oid = to_regclass($1)""",
+        formid, col_id
+    )
+    if stats is None or stats["reltuples"] < FACET_EXACT_ROWS:
+        return None
+    reltuples = stats["reltuples"]
+    vals, freqs = stats["vals"] or [], stats["freqs"] or []
+
+    # Sample counts of the top sampled values and of every MCV value
+    sample = await conn.fetch(
+        f"""WITH s AS (
+                SELECT {col_id} AS value, COUNT(*) AS count
+                FROM {formid} TABLESAMPLE SYSTEM ($1) REPEATABLE (0) GROUP BY 1
+            )
+            SELECT value, count, (SELECT SUM(count) FROM s)::bigint AS sampled FROM s
+            WHERE value = ANY($2::text[])
+               OR value IN (SELECT value FROM s ORDER BY count DESC, value LIMIT {limit})
+            ORDER BY count DESC, value""",
+        100.0 * FACET_SAMPLE_ROWS / reltuples, vals
+    )
+    if not stats["n_distinct"]:
+        return [{col_id: row["value"], "count": row["count"]} for row in sample[:limit]], "sample"
+
+    # Negative n_distinct is a fraction of the rows
+    n_distinct = stats["n_distinct"]
+    distinct = n_distinct if n_distinct > 0 else -n_distinct * reltuples
+    others = max(1.0, distinct - len(vals))
+    per_value = max(1, round((1 - stats["null_frac"] - sum(freqs)) * reltuples / others))
+    sampled = sample[0]["sampled"] if sample else 0
+    seen = {row["value"]: row["count"] for row in sample}
+
+    counts = {}
+    for value, freq in zip(vals, freqs):
+        # Keep the MCV count when the independent sample is more likely under
+        # it than under the per-value average (Poisson log-likelihoods)
+        k = seen.get(value, 0)
+        as_mcv, as_other = freq * sampled, per_value * sampled / reltuples
+        if sampled == 0 or k * math.log(as_mcv) - as_mcv >= k * math.log(as_other) - as_other:
+            counts[value] = round(freq * reltuples)
+        else:
+            counts[value] = per_value
+    for row in sample:
+        if row["value"] not in counts:
+            counts[row["value"]] = round(stats["null_frac"] * reltuples) if row["value"] is None else per_value
+    top = sorted(counts.items(), key=lambda item: (-item[1], item[0] is None, item[0] or ""))[:limit]
+    return [{col_id: value, "count": count} for value, count in top], "true"
 
 
 @router.post("/search")
-async def search(req: SearchRequest):
-    pool = await get_pool()
+async def search(req: SearchRequest, if_none_match: Optional[str] = Header(None)):
+    col = catalog.require_column(req.formid, req.columnid)
+    if req.mode not in SEARCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(SEARCH_MODES)}")
+    if req.mode != "exact":
+        if col["col_type"] not in search_index.TEXT_TYPES:
+            raise HTTPException(status_code=400, detail=f"Column {req.columnid} is not a text column")
+        if req.cursor:
+            raise HTTPException(status_code=400, detail="cursor is only supported in exact mode")
+    etag = _layer_etag(req.formid, req.model_dump_json())
+    if cached := _not_modified(if_none_match, etag):
+        return cached
+    layertype = catalog.get_layer(req.formid)["layertype"]
+    columns = _projection(req, req.formid)
+
+    if req.mode == "exact":
+        conditions, args = [f"{req.columnid} = $1"], [req.keyword]
+        geojson = _geojson_expr(req, layertype, args)
+        _page_filters(req, conditions, args)
+        pool = await _read_pool(req.formid)
+        async with pool.acquire() as conn:
+            rows, headers = await _fetch_page(
+                conn, f"SELECT {columns}, {geojson} as geojson FROM {req.formid}",
+                conditions, args, req
+            )
+            return RecordsResponse(rows, headers={**headers, "ETag": etag})
+
+    # Ranked modes: pg_trgm answers LIKE/ILIKE and % from the column's GIN index,
+    # built with the column (search_index.build_column_indexes)
+    pattern = search_index.like_escape(req.keyword)
+    if req.mode == "prefix":
+        conditions, args = [f"{req.columnid} ILIKE $2"], [req.keyword, pattern + "%"]
+    elif req.mode == "substring":
+        conditions, args = [f"{req.columnid} ILIKE $2"], [req.keyword, "%" + pattern + "%"]
+    else:
+        conditions, args = [f"{req.columnid} % $1"], [req.keyword]
+    geojson = _geojson_expr(req, layertype, args)
+    _page_filters(req, conditions, args)
+    limit = min(req.limit or SEARCH_LIMIT, MAX_PAGE_SIZE)
+    if limit < 1:
+        raise HTTPException(status_code=400, detail="limit must be positive")
+
+    pool = await _read_pool(req.formid)
     async with pool.acquire() as conn:
         rows = await conn.fetch(
-            f"SELECT *, ST_AsGeoJSON(geom) as geojson FROM {req.formid} WHERE {req.columnid} = $1",
-            req.keyword
+            f"""SELECT {columns}, {geojson} as geojson, similarity({req.columnid}, $1) AS score
+                FROM {req.formid} WHERE {' AND '.join(conditions)}
+                ORDER BY score DESC, id DESC LIMIT {limit}""",
+            *args
+        )
+        return RecordsResponse(rows, headers={"ETag": etag})
+
+
+@router.post("/global_search")
+async def global_search(req: GlobalSearchRequest):
+    keyword = req.keyword.strip()
+    if not keyword:
+        raise HTTPException(status_code=400, detail="Empty keyword")
+    limit = max(1, min(req.limit, SEARCH_LIMIT))
+    pool = await _read_pool()
+    async with pool.acquire() as conn:
+        rows = await search_index.search(conn, keyword, limit, req.fuzzy)
+    results = []
+    for row in rows:
+        layer = catalog.get_layer(row["formid"])
+        if layer is None:
+            continue
+        results.append({
+            "formid": row["formid"],
+            "layername": layer["layername"],
+            "id": row["id"],
+            "label": row["label"],
+            "centroid": [row["lng"], row["lat"]] if row["lng"] is not None else None,
+            "score": row["score"],
+        })
+    return RecordsResponse(results)
+
+
+@router.get("/tiles/{formid}/{z}/{x}/{y}.mvt")
+async def load_tile(
+    formid: str, z: int, x: int, y: int,
+    columns: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None)
+):
+    if z < 0 or z > 22 or not (0 <= x < 2 ** z) or not (0 <= y < 2 ** z):
+        raise HTTPException(status_code=400, detail="Invalid tile coordinates")
+
+    catalog.require_layer(formid)
+    etag = _layer_etag(formid, f"{z}/{x}/{y}?{columns}")
+    if cached := _not_modified(if_none_match, etag):
+        return cached
+
+    # Only attribute columns registered in layer_column may be requested;
+    # image columns are left out unless asked for, as in lite reads
+    wanted = set(columns.split(",")) if columns else None
+    col_exprs = []
+    for col in catalog.get_columns(formid):
+        if wanted is not None and col["col_id"] not in wanted:
+            continue
+        if wanted is None and col["col_type"] == "file":
+            continue
+        if col["col_type"] == "date":
+            col_exprs.append(f"t.{col['col_id']}::text AS {col['col_id']}")
+        else:
+            col_exprs.append(f"t.{col['col_id']}")
+    cols_str = "".join(f", {c}" for c in col_exprs)
+
+    pool = await _read_pool(formid)
+    async with pool.acquire() as conn:
+        tile = await conn.fetchval(
+            f"""WITH bounds AS (SELECT ST_TileEnvelope($1, $2, $3) AS geom),
+                mvtgeom AS (
+                    SELECT ST_AsMVTGeom(ST_Transform(t.geom, 3857), bounds.geom) AS geom,
+                           t.id{cols_str}
+                    FROM {formid} t, bounds
+                    WHERE t.geom && ST_Transform(bounds.geom, 4326)
+                )
+                SELECT ST_AsMVT(mvtgeom.*, $4, 4096, 'geom') FROM mvtgeom""",
+            z, x, y, formid
         )
-        return [dict(row) for row in rows]
+    return Response(
+        content=tile or b"",
+        media_type="application/vnd.mapbox-vector-tile",
+        headers={"ETag": etag},
+    )
 
 
 @router.post("/create_table")
@@ -273,263 +813,297 @@ async def create_table(req: CreateTableRequest):
                 style text
             )"""
         )
+        await conn.execute(f"CREATE INDEX {formid}_geom_idx ON {formid} USING GIST (geom)")
+        await conn.execute(f"CREATE INDEX {formid}_ts_idx ON {formid} (ts, id)")
+        columns = []
         for idx, col in enumerate(req.columes):
             col_id = f"{formid}_{idx}"
             col_type = col.get("column_type", "text")
-            if col_type == "file":
-                col_type = "text"
             await conn.execute(
                 """INSERT INTO layer_column (formid, col_id, col_name, col_type, col_desc) 
                    VALUES ($1, $2, $3, $4, $5)""",
                 formid, col_id, col["column_name"], col_type, col.get("column_desc", "")
             )
-            await conn.execute(f"ALTER TABLE {formid} ADD COLUMN {col_id} {col_type}")
+            await conn.execute(f"ALTER TABLE {formid} ADD COLUMN {col_id} {_pg_type(col_type)}")
+            columns.append({"col_id": col_id, "col_type": col_type})
+        async with conn.transaction():
+            await rollups.build(conn, formid, columns)
+            await search_index.build(conn, formid, columns)
+        catalog.set_version(formid, await catalog.bump_version(conn, formid))
+        await catalog.invalidate(conn)
 
     return {"formid": formid}
 
 
 @router.post("/save_layer")
 async def save_layer(req: SaveLayerRequest):
-    import json
-    from datetime import datetime
-    data_arr = json.loads(req.dataarr)
+    catalog.require_layer(req.formid)
+    values = _coerce_attributes(json.loads(req.dataarr), catalog.column_types(req.formid))
     refid = f"ref{int(time.time() * 1000)}"
+
+    cols = ["refid", "geom", "ts"] + list(values)
+    placeholders = ["$1", "ST_GeomFromGeoJSON($2)", "now()"]
+    placeholders += [f"${i + 3}" for i in range(len(values))]
     pool = await get_pool()
     async with pool.acquire() as conn:
-        # Insert the new geometry
-        await conn.execute(
-            f"INSERT INTO {req.formid} (refid, geom, ts) VALUES ($1, ST_GeomFromGeoJSON($2), now())",
-            refid, req.geojson
-        )
-        
-        # Fetch column types to handle date and numeric fields properly
-        column_types = {}
-        col_rows = await conn.fetch(
-            "SELECT col_id, col_type FROM layer_column WHERE formid = $1",
-            req.formid
-        )
-        for row in col_rows:
-            column_types[row["col_id"]] = row["col_type"]
-        
-        # Update attribute data with proper type conversion
-        for e in data_arr:
-            val = e.get("value", "")
-            col_name = e["name"]
-            col_type = column_types.get(col_name, "text")
-            
-            # Skip empty values (but allow "0" for numeric fields)
-            if not val and val != "0":
-                continue
-            
-            # Handle different column types for asyncpg
-            if col_type == "date":
-                if val:  # Only update if there's a value
-                    try:
-                        # Convert date string to Python date object for asyncpg
-                        date_val = datetime.strptime(val, "%Y-%m-%d").date()
-                        await conn.execute(
-                            f"UPDATE {req.formid} SET {col_name} = $1 WHERE refid = $2",
-                            date_val, refid
-                        )
-                    except (ValueError, TypeError):
-                        # If date parsing fails, skip this field
-                        pass
-            # For numeric columns, convert to float
-            elif col_type == "numeric":
+        async with conn.transaction():
+            new_id = await conn.fetchval(
+                f"""INSERT INTO {req.formid} ({', '.join(cols)})
+                    VALUES ({', '.join(placeholders)}) RETURNING id""",
+                refid, req.geojson, *values.values()
+            )
+            version = await catalog.bump_version(conn, req.formid)
+    catalog.set_version(req.formid, version)
+    return {"status": "saved", "id": new_id}
+
+
+async def _insert_features(conn, formid: str, items: list, column_types: dict) -> list:
+    """Insert (refid, geojson, style, values) items in one statement, returning ids in order."""
+    col_ids = sorted({col_id for item in items for col_id in item[3]})
+    arrays = [[item[0] for item in items], [item[1] for item in items], [item[2] for item in items]]
+    array_types = ["text[]", "text[]", "text[]"]
+    for col_id in col_ids:
+        arrays.append([item[3].get(col_id) for item in items])
+        col_type = column_types[col_id]
+        array_types.append("date[]" if col_type == "date" else "numeric[]" if col_type == "numeric" else "text[]")
+
+    params = ", ".join(f"${i + 1}::{t}" for i, t in enumerate(array_types))
+    target_cols = "".join(f", {c}" for c in col_ids)
+    select_cols = "".join(f", u.a{i}::{_pg_type(column_types[c])}" for i, c in enumerate(col_ids))
+    aliases = "".join(f", a{i}" for i in range(len(col_ids)))
+    rows = await conn.fetch(
+        f"""INSERT INTO {formid} (refid, geom, ts, style{target_cols})
+            SELECT u.refid, ST_GeomFromGeoJSON(u.geojson), now(), u.style{select_cols}
+            FROM unnest({params}) WITH ORDINALITY AS u(refid, geojson, style{aliases}, ord)
+            ORDER BY u.ord
+            RETURNING id, refid""",
+        *arrays
+    )
+    # RETURNING order is not guaranteed, so match ids back by each item's unique refid
+    ids = {row["refid"]: row["id"] for row in rows}
+    return [ids[item[0]] for item in items]
+
+
+@router.post("/save_layer_batch")
+async def save_layer_batch(req: SaveLayerBatchRequest):
+    catalog.require_layer(req.formid)
+    if len(req.features) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BATCH_SIZE} features per batch")
+    column_types = catalog.column_types(req.formid)
+    refid_base = int(time.time() * 1000000)
+
+    results = [None] * len(req.features)
+    pending, pending_idx = [], []
+    for idx, feature in enumerate(req.features):
+        try:
+            values = _coerce_attributes(json.loads(feature.dataarr), column_types)
+        except HTTPException as e:
+            results[idx] = {"index": idx, "error": e.detail}
+            continue
+        except (ValueError, TypeError, KeyError, AttributeError):
+            results[idx] = {"index": idx, "error": "Invalid dataarr"}
+            continue
+        pending.append((f"ref{refid_base + idx}", feature.geojson, feature.style, values))
+        pending_idx.append(idx)
+
+    version = None
+    if pending:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
                 try:
-                    float_val = float(val) if val else 0
-                    await conn.execute(
-                        f"UPDATE {req.formid} SET {col_name} = $1 WHERE refid = $2",
-                        float_val, refid
-                    )
-                except (ValueError, TypeError):
-                    pass
-            # For text and other types, update as string
-            else:
-                await conn.execute(
-                    f"UPDATE {req.formid} SET {col_name} = $1 WHERE refid = $2",
-                    str(val), refid
-                )
-    return {"status": "saved"}
+                    async with conn.transaction():
+                        ids = await _insert_features(conn, req.formid, pending, column_types)
+                    for idx, new_id in zip(pending_idx, ids):
+                        results[idx] = {"index": idx, "id": new_id}
+                except asyncpg.PostgresError:
+                    # Isolate the failing features with one savepoint each
+                    for idx, item in zip(pending_idx, pending):
+                        try:
+                            async with conn.transaction():
+                                ids = await _insert_features(conn, req.formid, [item], column_types)
+                            results[idx] = {"index": idx, "id": ids[0]}
+                        except asyncpg.PostgresError as e:
+                            results[idx] = {"index": idx, "error": str(e)}
+                if any(r and "id" in r for r in results):
+                    version = await catalog.bump_version(conn, req.formid)
+    if version is not None:
+        catalog.set_version(req.formid, version)
+
+    failed = sum(1 for r in results if "error" in r)
+    return {
+        "status": "saved" if not failed else "partial",
+        "saved": len(results) - failed,
+        "failed": failed,
+        "results": results,
+    }
 
 
 @router.post("/update_layer")
 async def update_layer(req: UpdateLayerRequest):
-    import json
-    from datetime import datetime
-    data_arr = json.loads(req.dataarr)
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        # Update geometry if provided
-        if req.geojson:
-            await conn.execute(
-                f"UPDATE {req.formid} SET geom = ST_GeomFromGeoJSON($1) WHERE id = $2",
-                req.geojson, req.id
-            )
-        
-        # Update attribute data
-        # We need to get column types to handle date and numeric fields properly
-        column_types = {}
-        col_rows = await conn.fetch(
-            "SELECT col_id, col_type FROM layer_column WHERE formid = $1",
-            req.formid
-        )
-        for row in col_rows:
-            column_types[row["col_id"]] = row["col_type"]
-        
-        for e in data_arr:
-            val = e.get("value", "")
-            col_name = e["name"]
-            col_type = column_types.get(col_name, "text")
-            
-            # Skip empty values (but allow "0" for numeric fields)
-            if not val and val != "0":
-                continue
-            
-            # Handle different column types for asyncpg
-            if col_type == "date":
-                if val:  # Only update if there's a value
-                    try:
-                        # Convert date string to Python date object for asyncpg
-                        date_val = datetime.strptime(val, "%Y-%m-%d").date()
-                        await conn.execute(
-                            f"UPDATE {req.formid} SET {col_name} = $1 WHERE id = $2",
-                            date_val, req.id
-                        )
-                    except (ValueError, TypeError):
-                        # If date parsing fails, skip this field
-                        pass
-            # For numeric columns, convert to float
-            elif col_type == "numeric":
-                try:
-                    float_val = float(val) if val else 0
-                    await conn.execute(
-                        f"UPDATE {req.formid} SET {col_name} = $1 WHERE id = $2",
-                        float_val, req.id
-                    )
-                except (ValueError, TypeError):
-                    pass
-            # For text and other types, update as string
-            else:
+    catalog.require_layer(req.formid)
+    values = _coerce_attributes(json.loads(req.dataarr), catalog.column_types(req.formid))
+
+    assignments, args = [], [req.id]
+    if req.geojson:
+        args.append(req.geojson)
+        assignments.append(f"geom = ST_GeomFromGeoJSON(${len(args)})")
+    for col_id, val in values.items():
+        args.append(val)
+        assignments.append(f"{col_id} = ${len(args)}")
+    if req.style:
+        args.append(req.style)
+        assignments.append(f"style = ${len(args)}")
+
+    if assignments:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            async with conn.transaction():
                 await conn.execute(
-                    f"UPDATE {req.formid} SET {col_name} = $1 WHERE id = $2",
-                    str(val), req.id
+                    f"UPDATE {req.formid} SET {', '.join(assignments)} WHERE id = $1",
+                    *args
                 )
-        
-        # Update style if provided
-        if req.style:
-            await conn.execute(
-                f"UPDATE {req.formid} SET style = $1 WHERE id = $2",
-                req.style, req.id
-            )
+                version = await catalog.bump_version(conn, req.formid)
+        catalog.set_version(req.formid, version)
     return {"status": "updated"}
 
 
 @router.post("/delete_row")
 async def delete_row(req: DeleteRowRequest):
+    catalog.require_layer(req.formid)
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute(f"DELETE FROM {req.formid} WHERE id = $1", req.id)
+        async with conn.transaction():
+            await conn.execute(f"DELETE FROM {req.formid} WHERE id = $1", req.id)
+            version = await catalog.bump_version(conn, req.formid)
+    catalog.set_version(req.formid, version)
     return {"status": "deleted"}
 
 
 @router.post("/delete_layer")
 async def delete_layer(req: FormIdRequest):
+    catalog.require_layer(req.formid)
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute("DELETE FROM layer_name WHERE formid = $1", req.formid)
         await conn.execute("DELETE FROM layer_column WHERE formid = $1", req.formid)
+        await rollups.drop(conn, req.formid)
+        await search_index.drop(conn, req.formid)
         await conn.execute(f"DROP TABLE IF EXISTS {req.formid}")
+        await conn.execute("DELETE FROM layer_version WHERE formid = $1", req.formid)
+        await catalog.invalidate(conn)
     return {"status": "deleted"}
 
 
 @router.post("/update_style")
 async def update_style(req: UpdateStyleRequest):
+    catalog.require_layer(req.formid)
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute(
-            f"UPDATE {req.formid} SET style = $1 WHERE id = $2",
-            req.layerstyle, req.layerid
-        )
+        async with conn.transaction():
+            await conn.execute(
+                f"UPDATE {req.formid} SET style = $1 WHERE id = $2",
+                req.layerstyle, req.layerid
+            )
+            version = await catalog.bump_version(conn, req.formid)
+    catalog.set_version(req.formid, version)
     return {"status": "updated"}
 
 
 @router.post("/add_column")
 async def add_column(req: AddColumnRequest):
+    catalog.require_layer(req.formid)
+    max_idx = 0
+    for col in catalog.get_columns(req.formid):
+        parts = col["col_id"].split("_")
+        if len(parts) >= 3:
+            try:
+                max_idx = max(max_idx, int(parts[2]))
+            except ValueError:
+                pass
+    col_id = f"{req.formid}_{max_idx + 1}"
+    col_type = req.col_type
+
+    columns = catalog.get_columns(req.formid) + [{"col_id": col_id, "col_type": col_type}]
+
     pool = await get_pool()
     async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT col_id FROM layer_column WHERE formid = $1 ORDER BY col_id",
-            req.formid
-        )
-        max_idx = 0
-        for row in rows:
-            parts = row["col_id"].split("_")
-            if len(parts) >= 3:
-                try:
-                    max_idx = max(max_idx, int(parts[2]))
-                except ValueError:
-                    pass
-        col_id = f"{req.formid}_{max_idx + 1}"
-        col_type = req.col_type if req.col_type != "file" else "text"
-
-        await conn.execute(
-            """INSERT INTO layer_column (formid, col_id, col_name, col_type, col_desc) 
-               VALUES ($1, $2, $3, $4, $5)""",
-            req.formid, col_id, req.col_name, col_type, req.col_desc
-        )
-        await conn.execute(f"ALTER TABLE {req.formid} ADD COLUMN {col_id} {col_type}")
+        async with conn.transaction():
+            await conn.execute(
+                """INSERT INTO layer_column (formid, col_id, col_name, col_type, col_desc) 
+                   VALUES ($1, $2, $3, $4, $5)""",
+                req.formid, col_id, req.col_name, col_type, req.col_desc
+            )
+            await conn.execute(f"ALTER TABLE {req.formid} ADD COLUMN {col_id} {_pg_type(col_type)}")
+            await rollups.build(conn, req.formid, columns)
+            await search_index.build(conn, req.formid, columns)
+        catalog.set_version(req.formid, await catalog.bump_version(conn, req.formid))
+        await catalog.invalidate(conn)
     return {"status": "added"}
 
 
 @router.post("/load_column")
 async def load_column(req: FormIdRequest):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        rows = await conn.fetch(
-            "SELECT * FROM layer_column WHERE formid = $1", req.formid
-        )
-        return [dict(row) for row in rows]
+    return catalog.get_columns(req.formid)
 
 
 @router.post("/delete_column")
 async def delete_column(req: DeleteColumnRequest):
+    catalog.require_column(req.formid, req.col_id)
+    columns = [col for col in catalog.get_columns(req.formid) if col["col_id"] != req.col_id]
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute(
-            "DELETE FROM layer_column WHERE formid = $1 AND col_id = $2",
-            req.formid, req.col_id
-        )
-        await conn.execute(f"ALTER TABLE {req.formid} DROP COLUMN {req.col_id}")
+        async with conn.transaction():
+            await conn.execute(
+                "DELETE FROM layer_column WHERE formid = $1 AND col_id = $2",
+                req.formid, req.col_id
+            )
+            # The rollup and search triggers reference the column, so rebuild them first
+            await rollups.build(conn, req.formid, columns)
+            await search_index.build(conn, req.formid, columns)
+            await conn.execute(f"ALTER TABLE {req.formid} DROP COLUMN {req.col_id}")
+        catalog.set_version(req.formid, await catalog.bump_version(conn, req.formid))
+        await catalog.invalidate(conn)
     return {"status": "deleted"}
 
 
 @router.post("/update_column")
 async def update_column(req: UpdateColumnRequest):
+    col = catalog.find_column(req.col_id)
+    if col is None:
+        raise HTTPException(status_code=400, detail=f"Unknown column: {req.col_id}")
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute(
             "UPDATE layer_column SET col_name = $1 WHERE col_id = $2",
             req.col_name, req.col_id
         )
+        catalog.set_version(col["formid"], await catalog.bump_version(conn, col["formid"]))
+        await catalog.invalidate(conn)
     return {"status": "updated"}
 
 
 @router.post("/summarize_layer")
-async def summarize_layer(req: FormIdRequest):
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        columns = await conn.fetch(
-            "SELECT * FROM layer_column WHERE formid = $1", req.formid
-        )
-        col_exprs = []
-        for col in columns:
-            if col["col_type"] == "numeric":
-                col_exprs.append(f"SUM({col['col_id']}) as {col['col_id']}")
-            else:
-                col_exprs.append(f"COUNT({col['col_id']}) as {col['col_id']}")
+async def summarize_layer(req: FormIdRequest, if_none_match: Optional[str] = Header(None)):
+    catalog.require_layer(req.formid)
+    key = _cache_key("summarize_layer", req)
+    etag = _layer_etag(req.formid, req.model_dump_json())
+    if cached := _not_modified(if_none_match, etag) or _cached_response(key, etag):
+        return cached
+    columns = catalog.get_columns(req.formid)
+    if not columns:
+        return []
+    col_exprs = []
+    for col in columns:
+        if col["col_type"] == "numeric":
+            col_exprs.append(f"SUM({col['col_id']}) as {col['col_id']}")
+        else:
+            col_exprs.append(f"COUNT({col['col_id']}) as {col['col_id']}")
 
-        if col_exprs:
+    pool = await _read_pool(req.formid)
+    async with pool.acquire() as conn:
+        rows = await rollups.monthly_summary(conn, req.formid, columns)
+        if rows is None:
             cols_str = ", ".join(col_exprs)
             sql = f"""
                 WITH tb AS (SELECT *, DATE_TRUNC('month', ts) AS d FROM {req.formid})
@@ -537,14 +1111,28 @@ async def summarize_layer(req: FormIdRequest):
                 FROM tb GROUP BY d
             """
             rows = await conn.fetch(sql)
-            return [dict(row) for row in rows]
-    return []
+    return _store_response(key, rows, {}, etag)
 
 
 @router.post("/count_layer_by_formid")
-async def count_layer_by_formid(req: CountLayerRequest):
-    pool = await get_pool()
+async def count_layer_by_formid(req: CountLayerRequest, if_none_match: Optional[str] = Header(None)):
+    catalog.require_layer(req.formid)
+    if req.groupby not in ("day", "month", "year"):
+        raise HTTPException(status_code=400, detail="groupby must be day, month or year")
+    if req.type == "sum" and req.col_id:
+        catalog.require_column(req.formid, req.col_id)
+    elif req.type != "count":
+        raise HTTPException(status_code=400, detail="type must be count, or sum with col_id")
+    key = _cache_key("count_layer_by_formid", req)
+    etag = _layer_etag(req.formid, req.model_dump_json())
+    if cached := _not_modified(if_none_match, etag) or _cached_response(key, etag):
+        return cached
+    pool = await _read_pool(req.formid)
     async with pool.acquire() as conn:
+        rows = await rollups.count_series(conn, req.formid, req.groupby, req.type, req.col_id)
+        if rows is not None:
+            return _store_response(key, rows, {}, etag)
+
         if req.type == "count":
             if req.groupby == "day":
                 sql = f"""
@@ -579,18 +1167,102 @@ async def count_layer_by_formid(req: CountLayerRequest):
                 """
 
         rows = await conn.fetch(sql)
-        return [dict(row) for row in rows]
+    return _store_response(key, rows, {}, etag)
+
+
+@router.post("/time_stats")
+async def time_stats(req: TimeStatsRequest, if_none_match: Optional[str] = Header(None)):
+    catalog.require_layer(req.formid)
+    numeric = [col["col_id"] for col in catalog.get_columns(req.formid) if col["col_type"] == "numeric"]
+    if req.col_ids is None:
+        col_ids = numeric
+    else:
+        for col_id in req.col_ids:
+            if col_id not in numeric:
+                raise HTTPException(status_code=400, detail=f"Not a numeric column: {col_id}")
+        col_ids = req.col_ids
+    if req.start and req.end and req.end < req.start:
+        raise HTTPException(status_code=400, detail="end must not be before start")
+
+    key = _cache_key("time_stats", req)
+    etag = _layer_etag(req.formid, req.model_dump_json())
+    if cached := _not_modified(if_none_match, etag) or _cached_response(key, etag):
+        return cached
+
+    pool = await _read_pool(req.formid)
+    async with pool.acquire() as conn:
+        if req.fill:
+            # An open bound is filled from the first/last recorded day
+            lo, hi = req.start, req.end
+            if lo is None or hi is None:
+                first, last = await rollups.date_range(conn, req.formid)
+                lo, hi = lo or first, hi or last
+            if lo and hi and (hi - lo).days >= TIME_STATS_MAX_DAYS:
+                raise HTTPException(
+                    status_code=400,
+                    detail=f"start to end spans more than {TIME_STATS_MAX_DAYS} days; narrow it or set fill=false"
+                )
+        rows = await rollups.time_stats(conn, req.formid, col_ids, req.start, req.end, req.fill)
+
+    result = {"day": [], "month": [], "year": []}
+    for row in rows:
+        entry = dict(row)
+        result[entry.pop("grain")].append(entry)
+    return _store_response(key, result, {}, etag)
 
 
 @router.get("/utm2latlng/{x}/{y}")
-async def utm2latlng(x: float, y: float):
+async def utm2latlng(x: float, y: float, epsg: int = 32647):
+    if epsg not in utm.ZONES:
+        raise HTTPException(status_code=400, detail=f"epsg must be one of {', '.join(map(str, utm.ZONES))}")
+    if not utm.utm_in_range(x, y)[0]:
+        raise HTTPException(status_code=400, detail="Coordinates outside the UTM zone")
+    lng, lat = utm.to_wgs84(x, y, epsg)
+    return {"lng": float(lng[0]), "lat": float(lat[0])}
+
+
+@router.post("/utm_transform")
+async def utm_transform(req: UtmTransformRequest):
+    if req.epsg not in utm.ZONES:
+        raise HTTPException(status_code=400, detail=f"epsg must be one of {', '.join(map(str, utm.ZONES))}")
+    if req.direction not in TRANSFORM_DIRECTIONS:
+        raise HTTPException(status_code=400, detail=f"direction must be one of {', '.join(TRANSFORM_DIRECTIONS)}")
+    if len(req.points) > MAX_TRANSFORM_POINTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TRANSFORM_POINTS} points per request")
+    if not req.points:
+        return {"epsg": req.epsg, "direction": req.direction, "points": []}
+
+    coords = np.array(req.points, dtype=float)
+    if req.direction == "to_wgs84":
+        transform, valid = utm.to_wgs84, utm.utm_in_range(coords[:, 0], coords[:, 1])
+    else:
+        transform, valid = utm.from_wgs84, utm.wgs84_in_range(coords[:, 0], coords[:, 1], req.epsg)
+    if not valid.all():
+        bad = int(np.argmin(valid))
+        raise HTTPException(status_code=400, detail=f"Point {bad} is outside the UTM zone: {req.points[bad]}")
+    a, b = await asyncio.to_thread(transform, coords[:, 0], coords[:, 1], req.epsg)
+    return {"epsg": req.epsg, "direction": req.direction, "points": np.column_stack([a, b]).tolist()}
+
+
+@router.get("/admin/cache_stats")
+async def cache_stats(user: dict = Depends(require_admin)):
+    return response_cache.stats()
+
+
+@router.get("/admin/pool_stats")
+async def pool_stats(user: dict = Depends(require_admin)):
     pool = await get_pool()
-    async with pool.acquire() as conn:
-        row = await conn.fetchrow(
-            f"""SELECT ST_X(ST_Transform(ST_GeomFromText('POINT({x} {y})', 32647), 4326)) as lng,
-                       ST_Y(ST_Transform(ST_GeomFromText('POINT({x} {y})', 32647), 4326)) as lat"""
-        )
-        return dict(row)
+    return {"primary": pool.stats(), "replica": replica_stats(), "bcrypt": bcrypt_stats()}
+
+
+@router.get("/admin/slow_queries")
+async def slow_queries(
+    limit: int = 50,
+    route: Optional[str] = None,
+    formid: Optional[str] = None,
+    user: dict = Depends(require_admin)
+):
+    return querylog.history(limit, route, formid)
 
 
 # ============ User Management ============
@@ -602,7 +1274,7 @@ async def list_users():
         rows = await conn.fetch(
             "SELECT id, username, email, division, auth, TO_CHAR(ts, 'DD-MM-YYYY') as ts FROM tb_user"
         )
-        return [dict(row) for row in rows]
+        return RecordsResponse(rows)
 
 
 @router.post("/edituser")
@@ -694,15 +1366,16 @@ async def change_password(req: ChangePasswordRequest, user: dict = Depends(verif
             "SELECT pass FROM tb_user WHERE username = $1",
             user["username"]
         )
-        if not row:
-            raise HTTPException(status_code=404, detail="User not found")
-        
-        # Verify current password
-        if not verify_password(req.current_password, row["pass"]):
-            raise HTTPException(status_code=400, detail="รหัสผ่านปัจจุบันไม่ถูกต้อง")
-        
-        # Hash and update new password
-        new_hash = get_password_hash(req.new_password)
+    if not row:
+        raise HTTPException(status_code=404, detail="User not found")
+
+    # Verify current password
+    if not await check_password(req.current_password, row["pass"]):
+        raise HTTPException(status_code=400, detail="รหัสผ่านปัจจุบันไม่ถูกต้อง")
+
+    # Hash and update new password
+    new_hash = await hash_password(req.new_password)
+    async with pool.acquire() as conn:
         await conn.execute(
             "UPDATE tb_user SET pass = $1 WHERE username = $2",
             new_hash, user["username"]
@@ -712,85 +1385,143 @@ async def change_password(req: ChangePasswordRequest, user: dict = Depends(verif
 
 # ============ File Upload ============
 
+def _csv_rows(text):
+    """csv.reader that skips empty lines, as csv.DictReader does for data rows.
+
+    Rows of empty cells (",,") and whitespace are kept, like DictReader; a
+    leading empty line is skipped too, where DictReader read an empty header.
+    """
+    for row in csv.reader(text):
+        if row:
+            yield row
+
+
+def _csv_records(reader, first_row: list, columns: list, refid_base: int):
+    """Yield COPY records for an upload without materialising the CSV."""
+    numeric = [c["col_type"] == "numeric" for c in columns]
+    width = len(columns)
+    for n, row in enumerate(itertools.chain([first_row], reader)):
+        if len(row) < width:
+            row = row + [None] * (width - len(row))
+        values = [f"ref{refid_base + n}"]
+        for val, is_numeric in zip(row, numeric):
+            if is_numeric:
+                try:
+                    values.append(float(val) if val else 0)
+                except ValueError:
+                    values.append(0)
+            else:
+                values.append(val)
+        yield values
+
+
+def _with_wgs84(records, e_idx: int, n_idx: int, epsg: int):
+    """Append lng/lat to upload records, projecting their UTM columns a batch at a time."""
+    while batch := list(itertools.islice(records, UTM_BATCH_SIZE)):
+        easting = np.array([r[e_idx] for r in batch], dtype=float)
+        northing = np.array([r[n_idx] for r in batch], dtype=float)
+        lng, lat = utm.to_wgs84(easting, northing, epsg)
+        valid = utm.utm_in_range(easting, northing)
+        for record, x, y, ok in zip(batch, lng.tolist(), lat.tolist(), valid.tolist()):
+            yield record + ([x, y] if ok else [None, None])
+
+
 @router.post("/upload")
 async def upload_file(
     file: UploadFile = File(...),
     division: str = Form(...),
     layername: str = Form(...),
-    layertype: str = Form(...)
+    layertype: str = Form(...),
+    srid: int = Form(4326)
 ):
+    if srid != 4326 and srid not in utm.ZONES:
+        raise HTTPException(status_code=400, detail=f"srid must be one of 4326, {', '.join(map(str, utm.ZONES))}")
     formid = f"fid_{int(time.time() * 1000)}"
-    content = await file.read()
-    text = content.decode("utf-8")
-    reader = csv.DictReader(io.StringIO(text))
-    data = list(reader)
-
-    if not data:
+    started = time.perf_counter()
+
+    # Decode the spooled upload incrementally instead of reading it whole
+    text = io.TextIOWrapper(file.file, encoding="utf-8-sig", newline="")
+    reader = _csv_rows(text)
+    keys = next(reader, None)
+    first_row = next(reader, None)
+    if not keys or first_row is None:
         raise HTTPException(status_code=400, detail="Empty CSV file")
 
+    # Determine columns
+    coord_names = UTM_COLUMN_NAMES if srid in utm.ZONES else LATLNG_COLUMN_NAMES
+    csv_columns = []
+    for idx, col_name in enumerate(keys):
+        coord = coord_names.get(col_name.lower())
+        col_type = "numeric" if coord else "text"
+        csv_columns.append({"col_id": coord or f"{formid}_{idx}", "col_name": col_name, "col_type": col_type})
+    csv_col_ids = [c["col_id"] for c in csv_columns]
+    records = _csv_records(reader, first_row, csv_columns, int(time.time() * 1000000))
+    columns = list(csv_columns)
+    if "utm_e" in csv_col_ids and "utm_n" in csv_col_ids:
+        # Keep the surveyed coordinates and store their WGS84 position next to them
+        records = _with_wgs84(records, 1 + csv_col_ids.index("utm_e"), 1 + csv_col_ids.index("utm_n"), srid)
+        columns += [
+            {"col_id": "lng", "col_name": "lng", "col_type": "numeric"},
+            {"col_id": "lat", "col_name": "lat", "col_type": "numeric"},
+        ]
+    col_ids = [c["col_id"] for c in columns]
+    col_defs = "".join(f", {c['col_id']} {c['col_type']}" for c in columns)
+
     pool = await get_pool()
     async with pool.acquire() as conn:
-        # Determine columns
-        keys = list(data[0].keys())
-        columns = []
-        for idx, col_name in enumerate(keys):
-            is_lat = col_name.lower() in ["ละติจูด", "latitude", "lat"]
-            is_lng = col_name.lower() in ["ลองจิจูด", "longitude", "long", "lng"]
-            col_type = "numeric" if is_lat or is_lng else "text"
-            col_id = "lat" if is_lat else ("lng" if is_lng else f"{formid}_{idx}")
-            columns.append({"col_id": col_id, "col_name": col_name, "col_type": col_type})
-
-        # Create layer
-        await conn.execute(
-            """INSERT INTO layer_name (formid, division, layername, layertype, ts) 
-               VALUES ($1, $2, $3, $4, now())""",
-            formid, division, layername, layertype
-        )
-        await conn.execute(
-            f"""CREATE TABLE {formid} (
-                id SERIAL PRIMARY KEY, 
-                refid text, 
-                geom GEOMETRY({layertype}, 4326), 
-                ts timestamp default now(), 
-                style text
-            )"""
-        )
+        async with conn.transaction():
+            # Large files take longer than the default statement limit
+            await conn.execute("SET LOCAL statement_timeout = 0")
 
-        for col in columns:
+            # Create layer
             await conn.execute(
+                """INSERT INTO layer_name (formid, division, layername, layertype, ts) 
+                   VALUES ($1, $2, $3, $4, now())""",
+                formid, division, layername, layertype
+            )
+            await conn.executemany(
                 """INSERT INTO layer_column (formid, col_id, col_name, col_type, col_desc) 
                    VALUES ($1, $2, $3, $4, $5)""",
-                formid, col["col_id"], col["col_name"], col["col_type"], col["col_name"]
+                [(formid, c["col_id"], c["col_name"], c["col_type"], c["col_name"]) for c in columns]
             )
-            await conn.execute(f"ALTER TABLE {formid} ADD COLUMN {col['col_id']} {col['col_type']}")
-
-        # Insert data
-        col_ids = [c["col_id"] for c in columns]
-        for row in data:
-            refid = f"ref{int(time.time() * 1000000)}"
-            values = []
-            for key, col in zip(keys, columns):
-                val = row.get(key, "")
-                if col["col_type"] == "numeric":
-                    try:
-                        values.append(float(val) if val else 0)
-                    except ValueError:
-                        values.append(0)
-                else:
-                    values.append(val)
-
-            placeholders = ", ".join([f"${i+2}" for i in range(len(values))])
             await conn.execute(
-                f"INSERT INTO {formid} (refid, {', '.join(col_ids)}) VALUES ($1, {placeholders})",
-                refid, *values
+                f"""CREATE TABLE {formid} (
+                    id SERIAL PRIMARY KEY, 
+                    refid text, 
+                    geom GEOMETRY({layertype}, 4326), 
+                    ts timestamp default now(), 
+                    style text{col_defs}
+                )"""
             )
 
-        # Update geometry if lat/lng exist
-        has_lat = any(c["col_id"] == "lat" for c in columns)
-        has_lng = any(c["col_id"] == "lng" for c in columns)
-        if has_lat and has_lng:
-            await conn.execute(
-                f"UPDATE {formid} SET geom = ST_SetSRID(ST_MakePoint(lng, lat), 4326) WHERE lat > 0 AND lng > 0"
+            # Insert data
+            result = await conn.copy_records_to_table(
+                formid,
+                records=records,
+                columns=["refid"] + col_ids,
             )
+            row_count = int(result.split()[-1])
+
+            # Build geometry set-based if lat/lng exist
+            if "lat" in col_ids and "lng" in col_ids:
+                await conn.execute(
+                    f"UPDATE {formid} SET geom = ST_SetSRID(ST_MakePoint(lng, lat), 4326) WHERE lat > 0 AND lng > 0"
+                )
 
-    return {"status": "success", "formid": formid}
+            # Indexes are cheaper to build once the data is loaded
+            await conn.execute(f"CREATE INDEX {formid}_geom_idx ON {formid} USING GIST (geom)")
+            await conn.execute(f"CREATE INDEX {formid}_ts_idx ON {formid} (ts, id)")
+            await conn.execute(f"ANALYZE {formid}")
+            await rollups.build(conn, formid, columns)
+            await search_index.build(conn, formid, columns)
+            version = await catalog.bump_version(conn, formid)
+        catalog.set_version(formid, version)
+        await catalog.invalidate(conn)
+
+    elapsed = time.perf_counter() - started
+    return {
+        "status": "success",
+        "formid": formid,
+        "rows": row_count,
+        "rows_per_sec": round(row_count / elapsed, 1) if elapsed > 0 else row_count,
+    }
@@ -0,0 +1,221 @@
+import asyncio
+import logging
+import asyncpg
+from config import get_settings
+from database import advisory_lock
+import catalog
+
+settings = get_settings()
+logger = logging.getLogger(__name__)
+
+TEXT_TYPES = ("text", "varchar")
+# Advisory lock held by the one worker repairing trigram indexes
+REPAIR_LOCK = 0x6c676961
+# Advisory lock serialising ensure_all across workers
+INDEX_LOCK = 0x6c676973
+
+_repair_task = None
+
+# One row per feature across all layers: the concatenated text attributes
+# (image columns excluded), a display label and a point on the geometry.
+# Per-layer statement triggers keep it in step with the layer tables.
+
+
+def like_escape(text: str) -> str:
+    """Escape LIKE/ILIKE wildcards so text matches literally."""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _text_columns(columns: list) -> list:
+    return [col["col_id"] for col in columns if col["col_type"] in TEXT_TYPES]
+
+
+async def ensure_schema(conn):
+    await conn.execute(
+        """CREATE TABLE IF NOT EXISTS search_index (
+            formid text NOT NULL,
+            id integer NOT NULL,
+            label text,
+            doc text NOT NULL,
+            centroid geometry(Point, 4326),
+            PRIMARY KEY (formid, id)
+        )"""
+    )
+    await conn.execute(
+        "CREATE INDEX IF NOT EXISTS search_index_doc_idx ON search_index USING GIN (doc gin_trgm_ops)"
+    )
+
+
+async def build(conn, formid: str, columns: list):
+    """(Re)index a layer and install its triggers; run inside a transaction."""
+    await conn.execute("SET LOCAL statement_timeout = 0")
+    await conn.execute(f"LOCK TABLE {formid} IN SHARE ROW EXCLUSIVE MODE")
+    await drop(conn, formid)
+    await build_column_indexes(conn, formid, columns)
+    text_cols = _text_columns(columns)
+    if not text_cols:
+        return
+
+    label = "COALESCE(" + ", ".join(f"NULLIF({c}, '')" for c in text_cols) + ")"
+    doc = "concat_ws(' ', " + ", ".join(text_cols) + ")"
+    select = f"""SELECT '{formid}', id, {label}, {doc}, ST_PointOnSurface(geom)
+                 FROM {{source}} WHERE {doc} <> ''"""
+
+    await conn.execute(
+        f"INSERT INTO search_index (formid, id, label, doc, centroid) {select.format(source=formid)}"
+    )
+    await conn.execute(
+        f"""CREATE FUNCTION {formid}_search() RETURNS trigger LANGUAGE plpgsql AS $fn$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM search_index
+                    WHERE formid = '{formid}' AND id IN (SELECT id FROM old_rows);
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO search_index (formid, id, label, doc, centroid)
+                    {select.format(source='new_rows')};
+                END IF;
+                RETURN NULL;
+            END
+            $fn$"""
+    )
+    for suffix, event, transitions in [
+        ("ins", "INSERT", "NEW TABLE AS new_rows"),
+        ("upd", "UPDATE", "OLD TABLE AS old_rows NEW TABLE AS new_rows"),
+        ("del", "DELETE", "OLD TABLE AS old_rows"),
+    ]:
+        await conn.execute(
+            f"""CREATE TRIGGER {formid}_search_{suffix} AFTER {event} ON {formid}
+                REFERENCING {transitions}
+                FOR EACH STATEMENT EXECUTE FUNCTION {formid}_search()"""
+        )
+
+
+async def drop(conn, formid: str):
+    await conn.execute(f"DROP FUNCTION IF EXISTS {formid}_search() CASCADE")
+    await conn.execute("DELETE FROM search_index WHERE formid = $1", formid)
+
+
+def trgm_index(formid: str, col_id: str) -> str:
+    return f"{formid}_{col_id}_trgm_idx"
+
+
+async def _trgm_indexes(conn, formid: str) -> dict:
+    """{index name: indisvalid} for the layer's indexes."""
+    rows = await conn.fetch(
+        """SELECT c.relname, i.indisvalid FROM pg_index i
+           JOIN pg_class c ON c.oid = i.indexrelid
+           WHERE i.indrelid = to_regclass($1)""",
+        formid
+    )
+    return {row["relname"]: row["indisvalid"] for row in rows}
+
+
+async def build_column_indexes(conn, formid: str, columns: list):
+    """Trigram-index the text columns for per-layer search; run inside build's transaction."""
+    existing = await _trgm_indexes(conn, formid)
+    for col_id in _text_columns(columns):
+        name = trgm_index(formid, col_id)
+        if existing.get(name):
+            continue
+        if name in existing:
+            await conn.execute(f"DROP INDEX {name}")
+        await conn.execute(f"CREATE INDEX {name} ON {formid} USING GIN ({col_id} gin_trgm_ops)")
+
+
+async def repair_column_indexes():
+    """Build missing or INVALID trigram indexes concurrently, one at a time.
+
+    A concurrent build cancelled midway leaves an INVALID index that IF NOT EXISTS
+    would skip forever, so those are dropped and rebuilt here.
+    """
+    conn = await asyncpg.connect(
+        host=settings.pg_host,
+        port=settings.pg_port,
+        user=settings.pg_user,
+        password=settings.pg_password,
+        database=settings.pg_name,
+        server_settings={"statement_timeout": "0"},
+    )
+    try:
+        if not await conn.fetchval("SELECT pg_try_advisory_lock($1)", REPAIR_LOCK):
+            return
+        for layer in catalog.get_layers():
+            formid = layer["formid"]
+            existing = await _trgm_indexes(conn, formid)
+            for col_id in _text_columns(catalog.get_columns(formid)):
+                name = trgm_index(formid, col_id)
+                if existing.get(name):
+                    continue
+                try:
+                    await conn.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+                    await conn.execute(
+                        f"CREATE INDEX CONCURRENTLY {name} ON {formid} USING GIN ({col_id} gin_trgm_ops)"
+                    )
+                    logger.info(f"Built trigram index {name}")
+                except asyncpg.PostgresError as e:
+                    logger.warning(f"Could not build trigram index {name}: {e}")
+    finally:
+        await conn.close()
+
+
+async def _safe_repair():
+    try:
+        await repair_column_indexes()
+    except (OSError, asyncpg.PostgresError) as e:
+        logger.warning(f"Trigram index repair failed: {e}")
+
+
+def start_repair():
+    """Repair trigram indexes in the background, outside any request."""
+    global _repair_task
+    if _repair_task is None:
+        _repair_task = asyncio.get_running_loop().create_task(_safe_repair())
+
+
+async def stop_repair():
+    global _repair_task
+    if _repair_task:
+        _repair_task.cancel()
+        _repair_task = None
+
+
+async def ensure_all(pool):
+    """Create the index table and index layers created before it existed.
+
+    Every worker runs this at startup; one builds while the rest wait for
+    the lock and then find nothing left to build.
+    """
+    async with pool.acquire() as conn, advisory_lock(conn, INDEX_LOCK):
+        await ensure_schema(conn)
+        rows = await conn.fetch(
+            """SELECT formid FROM layer_name
+               WHERE to_regclass(formid) IS NOT NULL
+                 AND to_regprocedure(formid || '_search()') IS NULL"""
+        )
+        for row in rows:
+            formid = row["formid"]
+            columns = catalog.get_columns(formid)
+            if not _text_columns(columns):
+                continue
+            try:
+                async with conn.transaction():
+                    await build(conn, formid, columns)
+                logger.info(f"Built search index for {formid}")
+            except asyncpg.PostgresError as e:
+                logger.warning(f"Could not build search index for {formid}: {e}")
+
+
+async def search(conn, keyword: str, limit: int, fuzzy: bool = False):
+    if fuzzy:
+        condition, args = "$1 <% doc", [keyword]
+    else:
+        pattern = like_escape(keyword)
+        condition, args = "doc ILIKE $2", [keyword, f"%{pattern}%"]
+    return await conn.fetch(
+        f"""SELECT formid, id, label, ST_X(centroid) AS lng, ST_Y(centroid) AS lat,
+                   word_similarity($1, doc) AS score
+            FROM search_index WHERE {condition}
+            ORDER BY score DESC, formid, id LIMIT {int(limit)}""",
+        *args
+    )
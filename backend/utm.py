@@ -0,0 +1,106 @@
+import numpy as np
+
+# WGS 84 / UTM zones covering Thailand: EPSG code -> central meridian
+ZONES = {32647: 99.0, 32648: 105.0}
+
+_A = 6378137.0
+_F = 1 / 298.257223563
+_K0 = 0.9996
+_FALSE_EASTING = 500000.0
+
+_N = _F / (2 - _F)
+_E = np.sqrt(_F * (2 - _F))
+_RECT = _A / (1 + _N) * (1 + _N**2 / 4 + _N**4 / 64 + _N**6 / 256)
+
+# Krüger series to sixth order in n (Karney 2011), sub-millimetre within a zone
+_ALPHA = np.array([
+    _N / 2 - 2 * _N**2 / 3 + 5 * _N**3 / 16 + 41 * _N**4 / 180 - 127 * _N**5 / 288 + 7891 * _N**6 / 37800,
+    13 * _N**2 / 48 - 3 * _N**3 / 5 + 557 * _N**4 / 1440 + 281 * _N**5 / 630 - 1983433 * _N**6 / 1935360,
+    61 * _N**3 / 240 - 103 * _N**4 / 140 + 15061 * _N**5 / 26880 + 167603 * _N**6 / 181440,
+    49561 * _N**4 / 161280 - 179 * _N**5 / 168 + 6601661 * _N**6 / 7257600,
+    34729 * _N**5 / 80640 - 3418889 * _N**6 / 1995840,
+    212378941 * _N**6 / 319334400,
+])
+_BETA = np.array([
+    _N / 2 - 2 * _N**2 / 3 + 37 * _N**3 / 96 - _N**4 / 360 - 81 * _N**5 / 512 + 96199 * _N**6 / 604800,
+    _N**2 / 48 + _N**3 / 15 - 437 * _N**4 / 1440 + 46 * _N**5 / 105 - 1118711 * _N**6 / 3870720,
+    17 * _N**3 / 480 - 37 * _N**4 / 840 - 209 * _N**5 / 4480 + 5569 * _N**6 / 90720,
+    4397 * _N**4 / 161280 - 11 * _N**5 / 504 - 830251 * _N**6 / 7257600,
+    4583 * _N**5 / 161280 - 108847 * _N**6 / 3991680,
+    20648693 * _N**6 / 638668800,
+])
+_J2 = 2 * np.arange(1, 7)[:, None]
+
+# Inputs the series is evaluated on (bounds exclusive); further out it loses
+# accuracy and eventually overflows to inf/NaN
+EASTING_RANGE = (0.0, 1_000_000.0)
+NORTHING_RANGE = (0.0, 9_400_000.0)
+LAT_RANGE = (-80.0, 84.0)
+MAX_LNG_OFFSET = 60.0
+
+
+def _central_meridian(epsg: int) -> float:
+    if epsg not in ZONES:
+        raise ValueError(f"Unsupported EPSG code: {epsg}")
+    return ZONES[epsg]
+
+
+def _conformal_tan(tau):
+    sigma = np.sinh(_E * np.arctanh(_E * tau / np.hypot(1, tau)))
+    return tau * np.hypot(1, sigma) - sigma * np.hypot(1, tau)
+
+
+def utm_in_range(easting, northing):
+    """Boolean mask of finite easting/northing pairs inside the northern-hemisphere zone."""
+    e = np.atleast_1d(np.asarray(easting, dtype=float))
+    n = np.atleast_1d(np.asarray(northing, dtype=float))
+    return (
+        (e > EASTING_RANGE[0]) & (e < EASTING_RANGE[1])
+        & (n > NORTHING_RANGE[0]) & (n < NORTHING_RANGE[1])
+    )
+
+
+def wgs84_in_range(lng, lat, epsg: int = 32647):
+    """Boolean mask of finite lng/lat pairs the zone's projection can represent."""
+    lng = np.atleast_1d(np.asarray(lng, dtype=float))
+    lat = np.atleast_1d(np.asarray(lat, dtype=float))
+    return (
+        (np.abs(lng - _central_meridian(epsg)) < MAX_LNG_OFFSET)
+        & (lat > LAT_RANGE[0]) & (lat < LAT_RANGE[1])
+    )
+
+
+def from_wgs84(lng, lat, epsg: int = 32647):
+    """Project longitude/latitude arrays (degrees) to UTM easting/northing (metres)."""
+    lam = np.radians(np.atleast_1d(np.asarray(lng, dtype=float)) - _central_meridian(epsg))
+    phi = np.radians(np.atleast_1d(np.asarray(lat, dtype=float)))
+
+    tau_c = _conformal_tan(np.tan(phi))
+    xi_c = np.arctan2(tau_c, np.cos(lam))
+    eta_c = np.arcsinh(np.sin(lam) / np.hypot(tau_c, np.cos(lam)))
+
+    xi = xi_c + np.sum(_ALPHA[:, None] * np.sin(_J2 * xi_c) * np.cosh(_J2 * eta_c), axis=0)
+    eta = eta_c + np.sum(_ALPHA[:, None] * np.cos(_J2 * xi_c) * np.sinh(_J2 * eta_c), axis=0)
+    return _FALSE_EASTING + _K0 * _RECT * eta, _K0 * _RECT * xi
+
+
+def to_wgs84(easting, northing, epsg: int = 32647):
+    """Unproject UTM easting/northing arrays (metres) to longitude/latitude (degrees)."""
+    lng0 = _central_meridian(epsg)
+    xi = np.atleast_1d(np.asarray(northing, dtype=float)) / (_K0 * _RECT)
+    eta = (np.atleast_1d(np.asarray(easting, dtype=float)) - _FALSE_EASTING) / (_K0 * _RECT)
+
+    xi_c = xi - np.sum(_BETA[:, None] * np.sin(_J2 * xi) * np.cosh(_J2 * eta), axis=0)
+    eta_c = eta - np.sum(_BETA[:, None] * np.cos(_J2 * xi) * np.sinh(_J2 * eta), axis=0)
+
+    tau_c = np.sin(xi_c) / np.hypot(np.sinh(eta_c), np.cos(xi_c))
+    lam = np.arctan2(np.sinh(eta_c), np.cos(xi_c))
+
+    # Newton's method for the geodetic latitude; converges in a few steps
+    tau = tau_c.copy()
+    for _ in range(5):
+        tau_i = _conformal_tan(tau)
+        tau += (tau_c - tau_i) / (1 - _E**2) * (1 + (1 - _E**2) * tau**2) / (
+            np.hypot(1, tau_i) * np.hypot(1, tau)
+        )
+    return lng0 + np.degrees(lam), np.degrees(np.arctan(tau))
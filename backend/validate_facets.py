@@ -0,0 +1,85 @@
+"""
+Check load_by_column_id's facet estimates (routes._estimate_facets) against
+exact GROUP BY counts on a generated table
+Usage:
+    python validate_facets.py                # 300,000 rows
+    python validate_facets.py --rows 1000000
+"""
+
+import argparse
+import asyncio
+import sys
+import asyncpg
+from config import get_settings
+from routes import FACET_EXACT_ROWS, _estimate_facets
+
+TABLE = "validate_facets"
+LIMIT = 20
+# Largest mean relative error allowed over the listed counts; single values
+# of flat columns can be off by more, as the sample holds only a few of each
+MAX_MEAN_ERROR = 0.25
+
+# Column -> SQL for its values: skewed (all values in the MCVs), all
+# distinct, uniform over a few thousand values (flat, with a few spurious
+# MCVs), a long tail behind a few common values, and mostly NULL
+COLUMNS = {
+    "skewed": "'k' || floor(10 * power(random(), 3))::int",
+    "unique_text": "'u' || i",
+    "uniform": "'v' || (i % 5000)",
+    "long_tail": "'w' || floor(1 / (random() + 1e-9))::bigint",
+    "sparse": "CASE WHEN random() < 0.7 THEN NULL ELSE 'n' || (i % 100) END",
+}
+
+
+async def check(conn, col_id: str) -> bool:
+    estimate = await _estimate_facets(conn, TABLE, col_id, LIMIT)
+    if estimate is None:
+        print(f"❌ {col_id}: no estimate")
+        return False
+    rows, kind = estimate
+    exact = {
+        r[col_id]: r["count"]
+        for r in await conn.fetch(f"SELECT {col_id}, COUNT(*) AS count FROM {TABLE} GROUP BY 1")
+    }
+    errors = [abs(r["count"] - exact[r[col_id]]) / exact[r[col_id]] for r in rows]
+    mean = sum(errors) / len(errors)
+    passed = kind == "true" and len(rows) == min(LIMIT, len(exact)) and mean <= MAX_MEAN_ERROR
+    print(f"{'✅' if passed else '❌'} {col_id}: {len(rows)} values, X-Facet-Estimated={kind}, "
+          f"count error mean {mean:.1%} max {max(errors):.1%}")
+    return passed
+
+
+async def validate(rows: int) -> bool:
+    settings = get_settings()
+    conn = await asyncpg.connect(
+        host=settings.pg_host,
+        port=settings.pg_port,
+        user=settings.pg_user,
+        password=settings.pg_password,
+        database=settings.pg_name
+    )
+    ok = True
+    try:
+        values = ", ".join(f"{sql} AS {col}" for col, sql in COLUMNS.items())
+        await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await conn.execute(f"CREATE TABLE {TABLE} AS SELECT i, {values} FROM generate_series(1, {rows}) i")
+        await conn.execute(f"ANALYZE {TABLE}")
+        for col_id in COLUMNS:
+            ok = await check(conn, col_id) and ok
+    finally:
+        await conn.execute(f"DROP TABLE IF EXISTS {TABLE}")
+        await conn.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=300_000)
+    args = parser.parse_args()
+    if args.rows < FACET_EXACT_ROWS:
+        parser.error(f"--rows must be at least {FACET_EXACT_ROWS} for facets to be estimated")
+    sys.exit(0 if asyncio.run(validate(args.rows)) else 1)
+
+
+if __name__ == "__main__":
+    main()
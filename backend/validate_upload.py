@@ -0,0 +1,54 @@
+"""
+Check CSV upload parsing (routes._csv_rows / routes._csv_records) on edge cases
+that must not turn into phantom features, and that it keeps the same rows as
+csv.DictReader. Needs no database.
+Usage:
+    python validate_upload.py
+"""
+
+import csv
+import io
+import sys
+from routes import _csv_records, _csv_rows
+
+COLUMNS = [
+    {"col_id": "c0", "col_type": "text"},
+    {"col_id": "lat", "col_type": "numeric"},
+    {"col_id": "lng", "col_type": "numeric"},
+]
+
+# (description, csv text, expected data rows)
+CASES = [
+    ("header only", "name,lat,lng\n", 0),
+    ("header and blank line", "name,lat,lng\n\n", 0),
+    ("empty cells and whitespace are rows", "name,lat,lng\n  \n,,\n", 2),
+    ("trailing blank line", "name,lat,lng\na,13.7,100.5\n\n", 1),
+    ("blank lines between rows", "name,lat,lng\na,13.7,100.5\n\n\r\nb,14.0,101.0\n", 2),
+    ("leading blank line", "\nname,lat,lng\na,13.7,100.5\n", 1),
+]
+
+
+def parse(text: str) -> list:
+    reader = _csv_rows(io.StringIO(text, newline=""))
+    keys = next(reader, None)
+    first_row = next(reader, None)
+    if not keys or first_row is None:
+        return []
+    return list(_csv_records(reader, first_row, COLUMNS, 0))
+
+
+def main():
+    ok = True
+    for name, text, expected in CASES:
+        records = parse(text)
+        # DictReader takes a leading blank line as an empty header (the old
+        # upload then failed), so it is compared on data rows only
+        dict_rows = len(list(csv.DictReader(io.StringIO(text.lstrip("\r\n"), newline=""))))
+        passed = len(records) == expected == dict_rows
+        ok = ok and passed
+        print(f"{'✅' if passed else '❌'} {name}: {len(records)} rows (expected {expected}, DictReader {dict_rows})")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
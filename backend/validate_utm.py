@@ -0,0 +1,77 @@
+"""
+Check the in-process UTM transform (utm.py) against PostGIS ST_Transform
+Usage:
+    python validate_utm.py                  # 10,000 random points per zone
+    python validate_utm.py --points 100000
+"""
+
+import argparse
+import asyncio
+import sys
+import asyncpg
+import numpy as np
+from config import get_settings
+import utm
+
+# Lon/lat extent checked in each zone: the zone itself plus a degree of overlap
+LAT_RANGE = (5.0, 21.0)
+ZONE_HALF_WIDTH = 4.0
+
+MAX_METRES = 0.001
+MAX_DEGREES = 1e-8
+
+TRANSFORM_SQL = """
+    SELECT ST_X(g) AS x, ST_Y(g) AS y
+    FROM unnest($1::float8[], $2::float8[]) WITH ORDINALITY AS p(x, y, n),
+         LATERAL (SELECT ST_Transform(ST_SetSRID(ST_MakePoint(x, y), $3), $4) AS g) t
+    ORDER BY n
+"""
+
+
+async def pg_transform(conn, a, b, source: int, target: int):
+    rows = await conn.fetch(TRANSFORM_SQL, a.tolist(), b.tolist(), source, target)
+    return np.array([r["x"] for r in rows]), np.array([r["y"] for r in rows])
+
+
+async def validate(points: int) -> bool:
+    settings = get_settings()
+    conn = await asyncpg.connect(
+        host=settings.pg_host,
+        port=settings.pg_port,
+        user=settings.pg_user,
+        password=settings.pg_password,
+        database=settings.pg_name
+    )
+    rng = np.random.default_rng(47)
+    ok = True
+    try:
+        for epsg, lng0 in utm.ZONES.items():
+            lng = rng.uniform(lng0 - ZONE_HALF_WIDTH, lng0 + ZONE_HALF_WIDTH, points)
+            lat = rng.uniform(*LAT_RANGE, points)
+
+            pg_e, pg_n = await pg_transform(conn, lng, lat, 4326, epsg)
+            e, n = utm.from_wgs84(lng, lat, epsg)
+            forward = max(np.abs(e - pg_e).max(), np.abs(n - pg_n).max())
+
+            pg_lng, pg_lat = await pg_transform(conn, pg_e, pg_n, epsg, 4326)
+            lng2, lat2 = utm.to_wgs84(pg_e, pg_n, epsg)
+            inverse = max(np.abs(lng2 - pg_lng).max(), np.abs(lat2 - pg_lat).max())
+
+            passed = forward <= MAX_METRES and inverse <= MAX_DEGREES
+            ok = ok and passed
+            print(f"{'✅' if passed else '❌'} EPSG:{epsg} {points} points: "
+                  f"forward max error {forward:.2e} m, inverse max error {inverse:.2e}°")
+    finally:
+        await conn.close()
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=10_000)
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(validate(args.points)) else 1)
+
+
+if __name__ == "__main__":
+    main()